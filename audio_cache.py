@@ -0,0 +1,193 @@
+import asyncio
+import hashlib
+import os
+import shutil
+import sqlite3
+import time
+from config import AUDIO_CACHE_DIR, AUDIO_CACHE_MAX_BYTES
+
+
+def file_digest(path):
+    """SHA-256 of a file, read in chunks"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class AudioCache:
+    """Size-bounded on-disk cache of downloaded audio files with LRU eviction"""
+
+    def __init__(self, directory=AUDIO_CACHE_DIR, max_bytes=AUDIO_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.tmp_directory = os.path.join(directory, 'tmp')
+        self.max_bytes = max_bytes
+        self.downloads = {}  # Webpage URL -> download task
+        self.on_downloaded = None  # Called with the webpage URL and local stream of each finished download
+        self.verified = False  # No downloads start before verify(), which would delete their files
+        self.hits = 0
+        self.misses = 0
+
+        os.makedirs(self.tmp_directory, exist_ok=True)
+        self.db = sqlite3.connect(os.path.join(directory, 'index.db'))
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS audio_cache (
+                webpage_url TEXT PRIMARY KEY,
+                filename TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                sha256 TEXT NOT NULL,
+                acodec TEXT,
+                ext TEXT,
+                last_used REAL NOT NULL
+            )
+        """)
+        self.db.commit()
+
+    def get(self, webpage_url):
+        """Return stream info for a cached file, or None.
+
+        The file must still exist with its recorded size; anything else is
+        treated as corruption and the entry is dropped.
+        """
+        row = self.db.execute(
+            'SELECT filename, size, acodec, ext FROM audio_cache WHERE webpage_url = ?', (webpage_url,)
+        ).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+
+        filename, size, acodec, ext = row
+        path = os.path.join(self.directory, filename)
+        if not os.path.isfile(path) or os.path.getsize(path) != size:
+            self._remove(webpage_url, filename)
+            self.misses += 1
+            return None
+
+        self.db.execute('UPDATE audio_cache SET last_used = ? WHERE webpage_url = ?', (time.time(), webpage_url))
+        self.db.commit()
+        self.hits += 1
+        return {'url': path, 'acodec': acodec, 'ext': ext, 'local': True}
+
+    def contains(self, webpage_url):
+        return self.db.execute(
+            'SELECT 1 FROM audio_cache WHERE webpage_url = ?', (webpage_url,)
+        ).fetchone() is not None
+
+    def schedule_download(self, resolver, webpage_url, stream):
+        """Download a track in the background unless it is cached or already downloading"""
+        if not self.verified or webpage_url in self.downloads or self.contains(webpage_url):
+            return
+        task = asyncio.get_running_loop().create_task(self._download(resolver, webpage_url, stream))
+        self.downloads[webpage_url] = task
+        task.add_done_callback(lambda _: self.downloads.pop(webpage_url, None))
+
+    async def _download(self, resolver, webpage_url, stream):
+        try:
+            info = await resolver.download(webpage_url, {
+                'format': stream.get('format_id') or 'bestaudio/best',
+                'outtmpl': os.path.join(self.tmp_directory, '%(id)s.%(ext)s'),
+            })
+            downloads = info.get('requested_downloads') or [{}]
+            tmp_path = downloads[0].get('filepath') or os.path.join(
+                self.tmp_directory, f"{info['id']}.{info['ext']}"
+            )
+
+            # Hashing a large file shouldn't stall the event loop
+            loop = asyncio.get_running_loop()
+            sha256 = await loop.run_in_executor(None, file_digest, tmp_path)
+            size = os.path.getsize(tmp_path)
+            if size > self.max_bytes:
+                os.remove(tmp_path)
+                return
+
+            filename = os.path.basename(tmp_path)
+            shutil.move(tmp_path, os.path.join(self.directory, filename))
+            self.db.execute(
+                'INSERT OR REPLACE INTO audio_cache VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (webpage_url, filename, size, sha256, stream.get('acodec'), stream.get('ext'), time.time())
+            )
+            self.db.commit()
+            self._evict()
+            if self.on_downloaded:
+                self.on_downloaded(webpage_url, {'url': os.path.join(self.directory, filename),
+                                                 'acodec': stream.get('acodec'), 'ext': stream.get('ext'),
+                                                 'local': True})
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Error downloading audio for cache: {e}")
+
+    def _evict(self):
+        """Delete least recently used files until the cache fits its size budget"""
+        total = self.db.execute('SELECT COALESCE(SUM(size), 0) FROM audio_cache').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        rows = self.db.execute('SELECT webpage_url, filename, size FROM audio_cache ORDER BY last_used ASC').fetchall()
+        for webpage_url, filename, size in rows:
+            if total <= self.max_bytes:
+                break
+            if self._remove(webpage_url, filename):
+                total -= size
+
+    def _remove(self, webpage_url, filename):
+        """Drop an entry and its file; returns False if the file is still in use"""
+        path = os.path.join(self.directory, filename)
+        try:
+            if os.path.exists(path):
+                os.remove(path)
+        except OSError:
+            # Windows can't delete a file FFmpeg is still reading
+            return False
+        self.db.execute('DELETE FROM audio_cache WHERE webpage_url = ?', (webpage_url,))
+        self.db.commit()
+        return True
+
+    def verify(self):
+        """Full integrity check: re-hash every file and drop mismatches and orphans.
+
+        Blocking; run it once at startup in an executor. Downloads are only
+        scheduled once it has finished, so their files are never mistaken for
+        leftovers; playing already cached files is fine meanwhile.
+        """
+        db = sqlite3.connect(os.path.join(self.directory, 'index.db'))
+        try:
+            known = set()
+            for webpage_url, filename, sha256 in db.execute(
+                    'SELECT webpage_url, filename, sha256 FROM audio_cache').fetchall():
+                path = os.path.join(self.directory, filename)
+                if os.path.isfile(path) and file_digest(path) == sha256:
+                    known.add(filename)
+                    continue
+                db.execute('DELETE FROM audio_cache WHERE webpage_url = ?', (webpage_url,))
+                if os.path.exists(path):
+                    os.remove(path)
+            db.commit()
+
+            for filename in os.listdir(self.directory):
+                path = os.path.join(self.directory, filename)
+                if os.path.isfile(path) and filename != 'index.db' and not filename.startswith('index.db-') \
+                        and filename not in known:
+                    os.remove(path)
+            shutil.rmtree(self.tmp_directory, ignore_errors=True)
+            os.makedirs(self.tmp_directory, exist_ok=True)
+        finally:
+            db.close()
+            self.verified = True
+
+    def stats(self):
+        total, count = self.db.execute('SELECT COALESCE(SUM(size), 0), COUNT(*) FROM audio_cache').fetchone()
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / lookups if lookups else 0.0,
+            'entries': count,
+            'bytes': total
+        }
+
+    def close(self):
+        for task in list(self.downloads.values()):
+            task.cancel()
+        self.db.close()
@@ -0,0 +1,731 @@
+#!/usr/bin/env python3
+"""
+Offline benchmark for the music bot.
+
+Runs the real bot code against simulated guilds, with a fake yt-dlp
+extractor, a fake Spotify API and fake voice clients that consume audio
+frames in real time. Nothing touches the network, so it can gate releases:
+
+    python benchmark.py --guilds 20 --duration 30 --max-ttfa-p95 1.5
+
+With --startup it instead measures how long each subsystem takes to
+import and initialize in a fresh interpreter, split into what happens
+before the bot can connect and what is deferred to the background warm-up.
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from collections import defaultdict
+
+import discord
+
+FRAME_SECONDS = 0.02
+SILENCE = b'\x00' * 3840  # 20 ms of 48 kHz stereo 16-bit PCM
+
+# Statements timed in order by the startup benchmark, each in the same namespace
+STARTUP_STEPS = [
+    ('discord.py', 'import discord'),
+    ('config', 'import config'),
+    ('metrics', 'import metrics'),
+    ('resolver', 'import resolver'),
+    ('spotify', 'import spotify_handler'),
+    ('music_bot', 'import music_bot'),
+    ('MusicBot()', 'bot = music_bot.MusicBot()'),
+]
+WARM_UP_STEPS = [
+    ('yt-dlp', 'resolver.load_yt_dlp()'),
+]
+STARTUP_SCRIPT = """
+import json, sys, time
+namespace = {}
+timings = []
+for name, statement in json.loads(sys.argv[1]):
+    started = time.perf_counter()
+    exec(statement, namespace)
+    timings.append((name, time.perf_counter() - started))
+print(json.dumps(timings))
+"""
+
+# Relative weight of each command while a guild is playing
+COMMAND_MIX = [
+    ('play', 25), ('queue', 20), ('nowplaying', 15), ('skip', 10), ('volume', 8),
+    ('pause', 5), ('shuffle', 5), ('move', 5), ('remove', 4), ('clear', 3),
+]
+
+# Songs indexed among the filler tracks: webpage URL, title and Spotify title and artist (or None)
+INDEX_SONGS = [
+    ('bench://queen', 'Queen - Bohemian Rhapsody (Official Video Remastered)', ('Bohemian Rhapsody', 'Queen')),
+    ('bench://adele', 'Adele - Hello (Official Music Video)', None),
+    ('bench://richie', 'Lionel Richie - Hello', ('Hello', 'Lionel Richie')),
+    ('bench://daft-punk', 'Daft Punk - Get Lucky (Official Audio) ft. Pharrell Williams',
+     ('Get Lucky', 'Daft Punk, Pharrell Williams')),
+    ('bench://astley', 'Rick Astley - Never Gonna Give You Up (Official Music Video)', None),
+]
+# Queries and the song the index must answer them with, or None where it must fall back to YouTube
+INDEX_PROBES = [
+    ('bohemian rhapsody', 'bench://queen'),
+    ('queen bohemian rhapsody', 'bench://queen'),
+    ('bohemain rhapsody', 'bench://queen'),  # Swapped letters
+    ('bohemian rapsody queen', 'bench://queen'),  # Missing letter
+    ('adele hello', 'bench://adele'),
+    ('never gonna give you up', 'bench://astley'),
+    ('get lucky daft punk', 'bench://daft-punk'),
+    ('hello', None),  # Two songs have this title
+    ('daft punk', None),  # Artist only
+    ('never gonna', None),  # Part of a title
+    ('give you up', None),
+    ('bohemian rhapsody live', None),  # Possibly a different upload
+]
+
+
+class FakeExtractor:
+    """Stand-in for yt-dlp: answers searches and URL lookups after a random delay.
+
+    Runs in the resolver's worker pool exactly like the real extractor, so
+    its latency occupies a worker the same way.
+    """
+
+    def __init__(self, latency=0.3, jitter=0.5, failure_rate=0.0, song_seconds=5.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.song_seconds = song_seconds
+
+    def __call__(self, ytdl_options, query, download=False):
+        time.sleep(self.latency * random.uniform(1 - self.jitter, 1 + self.jitter))
+        if random.random() < self.failure_rate:
+            raise RuntimeError(f"Fake extraction failure: {query}")
+
+        if query.startswith('ytsearch'):
+            text = query.split(':', 1)[1]
+            video_id = hashlib.md5(text.encode()).hexdigest()[:11]
+            return {'entries': [self.info(video_id, text.title())]}
+        video_id = query.rsplit('=', 1)[-1]
+        return self.info(video_id, f"Video {video_id}")
+
+    def info(self, video_id, title):
+        return {
+            'id': video_id,
+            'title': title,
+            'webpage_url': f'https://www.youtube.com/watch?v={video_id}',
+            'duration': int(self.song_seconds),
+            'thumbnail': '',
+            'formats': [{
+                'format_id': '251',
+                'url': f'fake://{video_id}?seconds={self.song_seconds}',
+                'acodec': 'opus',
+                'vcodec': 'none',
+                'ext': 'webm',
+                'abr': 128,
+                'protocol': 'https',
+            }],
+        }
+
+
+class FakeSpotifyClient:
+    """Serves generated albums and playlists shaped like the Spotify Web API"""
+
+    PAGE_SIZE = 100
+
+    def __init__(self, latency=0.1, playlist_size=50, song_seconds=5.0):
+        self.latency = latency
+        self.playlist_size = playlist_size
+        self.song_seconds = song_seconds
+
+    async def _wait(self):
+        await asyncio.sleep(self.latency * random.uniform(0.5, 1.5))
+
+    def _track(self, collection_id, index):
+        return {
+            'id': f'{collection_id}-{index}',
+            'type': 'track',
+            'name': f'Track {index} of {collection_id}',
+            'artists': [{'name': f'Artist {index % 7}'}],
+            'album': {'name': f'Album {collection_id}', 'images': []},
+            'duration_ms': int(self.song_seconds * 1000),
+            'external_urls': {},
+        }
+
+    def _page(self, collection_id, offset, wrap):
+        end = min(offset + self.PAGE_SIZE, self.playlist_size)
+        items = [self._track(collection_id, index) for index in range(offset, end)]
+        return {
+            'items': [{'track': item} for item in items] if wrap else items,
+            'next': f'fake-next:{collection_id}:{end}:{int(wrap)}' if end < self.playlist_size else None,
+            'total': self.playlist_size,
+        }
+
+    async def track(self, track_id):
+        await self._wait()
+        collection_id, _, index = track_id.rpartition('-')
+        return self._track(collection_id or track_id, int(index or 0))
+
+    async def album(self, album_id):
+        await self._wait()
+        return {'name': f'Album {album_id}', 'artists': [{'name': 'Artist'}], 'images': [],
+                'total_tracks': self.playlist_size, 'tracks': self._page(album_id, 0, wrap=False)}
+
+    async def playlist(self, playlist_id, fields=None):
+        await self._wait()
+        if fields == 'snapshot_id':
+            return {'snapshot_id': 'snapshot-1'}
+        return {'name': f'Playlist {playlist_id}', 'owner': {'display_name': 'Benchmark'},
+                'snapshot_id': 'snapshot-1', 'tracks': self._page(playlist_id, 0, wrap=True)}
+
+    async def next(self, page):
+        if not page.get('next'):
+            return None
+        await self._wait()
+        _, collection_id, offset, wrap = page['next'].split(':')
+        return self._page(collection_id, int(offset), wrap == '1')
+
+    async def close(self):
+        pass
+
+
+class Stats:
+    """Measurements collected from the event loop and the fake audio threads"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.first_audio = []
+        self.gaps = []
+        self.command_latency = defaultdict(list)
+        self.frames = 0
+        self.play_requested = {}  # Guild ID -> perf_counter() of a play command sent while idle
+        self.last_end = {}  # Guild ID -> perf_counter() when its previous song stopped
+
+    def first_frame(self, guild_id, now):
+        with self.lock:
+            requested = self.play_requested.pop(guild_id, None)
+            if requested is not None:
+                self.first_audio.append(now - requested)
+            ended = self.last_end.pop(guild_id, None)
+            if ended is not None:
+                self.gaps.append(now - ended)
+
+    def song_end(self, guild_id, now, frames):
+        with self.lock:
+            self.last_end[guild_id] = now
+            self.frames += frames
+
+
+class FakeSource(discord.AudioSource):
+    """Silent stand-in for an FFmpeg PCM source, a fixed number of frames long"""
+
+    def __init__(self, seconds):
+        self.frames_left = max(int(seconds / FRAME_SECONDS), 1)
+
+    def read(self):
+        if self.frames_left <= 0:
+            return b''
+        self.frames_left -= 1
+        return SILENCE
+
+    def is_opus(self):
+        return False
+
+    def cleanup(self):
+        self.frames_left = 0
+
+
+class FakeVoiceClient:
+    """Plays sources on a thread at real-time speed, like discord.py's AudioPlayer"""
+
+    def __init__(self, channel, stats):
+        self.channel = channel
+        self.guild = channel.guild
+        self.stats = stats
+        self.source = None
+        self.thread = None
+        self.ended = threading.Event()
+        self.resumed = threading.Event()
+
+    def play(self, source, after=None):
+        if self.thread and self.thread.is_alive() and not self.ended.is_set():
+            raise RuntimeError('Already playing audio.')
+        self.source = source
+        self.ended = threading.Event()
+        self.resumed = threading.Event()
+        self.resumed.set()
+        self.thread = threading.Thread(target=self._run, args=(source, after, self.ended, self.resumed), daemon=True)
+        self.thread.start()
+
+    def _run(self, source, after, ended, resumed):
+        frames = 0
+        next_frame = time.perf_counter()
+        while not ended.is_set():
+            if not resumed.is_set():
+                resumed.wait()
+                next_frame = time.perf_counter()
+                continue
+            data = source.read()
+            if not data:
+                break
+            if frames == 0:
+                self.stats.first_frame(self.guild.id, time.perf_counter())
+            frames += 1
+            next_frame += FRAME_SECONDS
+            time.sleep(max(next_frame - time.perf_counter(), 0))
+        ended.set()
+        self.stats.song_end(self.guild.id, time.perf_counter(), frames)
+        source.cleanup()
+        if after:
+            after(None)
+
+    def is_playing(self):
+        return self.thread is not None and not self.ended.is_set() and self.resumed.is_set()
+
+    def is_paused(self):
+        return self.thread is not None and not self.ended.is_set() and not self.resumed.is_set()
+
+    def pause(self):
+        self.resumed.clear()
+
+    def resume(self):
+        self.resumed.set()
+
+    def stop(self):
+        self.ended.set()
+        self.resumed.set()
+
+    async def disconnect(self, force=False):
+        self.stop()
+        self.guild.voice_client = None
+
+
+class FakeMessage:
+    async def edit(self, **kwargs):
+        pass
+
+
+class FakeTextChannel:
+    def __init__(self, channel_id):
+        self.id = channel_id
+
+    async def send(self, content=None, **kwargs):
+        return FakeMessage()
+
+
+class FakeVoiceChannel:
+    def __init__(self, guild, stats):
+        self.id = guild.id * 10 + 1
+        self.name = f'voice-{guild.id}'
+        self.guild = guild
+        self.stats = stats
+        self.members = []
+
+    async def connect(self):
+        self.guild.voice_client = FakeVoiceClient(self, self.stats)
+        return self.guild.voice_client
+
+
+class FakeGuild:
+    def __init__(self, guild_id, stats):
+        self.id = guild_id
+        self.voice_client = None
+        self.text_channel = FakeTextChannel(guild_id * 10)
+        self.voice_channel = FakeVoiceChannel(self, stats)
+
+    def get_channel(self, channel_id):
+        return {self.text_channel.id: self.text_channel, self.voice_channel.id: self.voice_channel}.get(channel_id)
+
+
+class FakeMember:
+    bot = False
+
+    def __init__(self, guild):
+        self.mention = f'<@{guild.id}>'
+        self.voice = type('VoiceState', (), {'channel': guild.voice_channel})()
+
+
+class FakeContext:
+    def __init__(self, guild):
+        self.guild = guild
+        self.channel = guild.text_channel
+        self.author = FakeMember(guild)
+
+    @property
+    def voice_client(self):
+        return self.guild.voice_client
+
+    async def send(self, content=None, **kwargs):
+        return await self.channel.send(content, **kwargs)
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(int(fraction * len(values)), len(values) - 1)]
+
+
+def summarize(values):
+    return {
+        'count': len(values),
+        'p50': percentile(values, 0.50),
+        'p95': percentile(values, 0.95),
+        'p99': percentile(values, 0.99),
+        'max': max(values) if values else None,
+    }
+
+
+class Benchmark:
+    def __init__(self, args):
+        self.args = args
+        self.stats = Stats()
+        self.random = random.Random(args.seed)
+        self.guilds = {}
+        self.commands_run = 0
+        self.bot = None
+
+    async def setup(self):
+        from music_bot import MusicBot
+        from resolver import YTDLResolver
+        from search_cache import SearchCache
+
+        args = self.args
+        bot = MusicBot()
+        bot.loop = asyncio.get_running_loop()
+        bot.get_guild = self.guilds.get
+        bot.get_channel = self.find_channel
+
+        bot.resolver.close()
+        cache = SearchCache(os.path.join(args.workdir, 'search_cache.db')) if args.search_cache else None
+        bot.resolver = YTDLResolver(bot.get_ytdl_options(), cache=cache, extractor=FakeExtractor(
+            args.extract_latency, args.jitter, args.failure_rate, args.song_seconds
+        ))
+        bot.spotify_handler.sp = FakeSpotifyClient(args.spotify_latency, args.playlist_size, args.song_seconds)
+
+        async def create_audio_source(stream, start=0, pcm=False, gain=1.0):
+            seconds = float(stream['url'].rsplit('=', 1)[-1])
+            return FakeSource(seconds - start)
+        bot.create_audio_source = create_audio_source
+
+        if bot.watchdog:
+            bot.watchdog.start()
+        self.bot = bot
+
+    def find_channel(self, channel_id):
+        guild = self.guilds.get(channel_id // 10)
+        return guild.get_channel(channel_id) if guild else None
+
+    async def run_command(self, ctx, name, *args, **kwargs):
+        command = getattr(type(self.bot), name)
+        callback = getattr(command, 'callback', command)
+        started = time.perf_counter()
+        ctx.invoked_at = started
+        try:
+            await callback(self.bot, ctx, *args, **kwargs)
+        except Exception as e:
+            print(f"Command {name} failed: {e}")
+        self.stats.command_latency[name].append(time.perf_counter() - started)
+        self.commands_run += 1
+
+    def random_query(self):
+        # A skewed song popularity, so some searches repeat like in real use
+        song = int(self.random.paretovariate(1.2)) % self.args.catalog_size
+        return f"benchmark song {song}"
+
+    async def play(self, ctx):
+        guild_id = ctx.guild.id
+        if self.bot.is_idle(guild_id):
+            self.stats.play_requested[guild_id] = time.perf_counter()
+        if self.random.random() < self.args.spotify_share:
+            playlist = self.random.randrange(self.args.catalog_size // 10 + 1)
+            await self.run_command(ctx, 'play', query=f'https://open.spotify.com/playlist/bench{playlist}')
+        else:
+            await self.run_command(ctx, 'play', query=self.random_query())
+
+    async def simulate_guild(self, guild_id, deadline):
+        guild = FakeGuild(guild_id, self.stats)
+        self.guilds[guild_id] = guild
+        ctx = FakeContext(guild)
+        await asyncio.sleep(self.random.uniform(0, self.args.ramp))
+
+        await self.run_command(ctx, 'join')
+        await self.play(ctx)
+        names = [name for name, _ in COMMAND_MIX]
+        weights = [weight for _, weight in COMMAND_MIX]
+
+        while time.monotonic() < deadline:
+            await asyncio.sleep(self.random.expovariate(self.args.command_rate))
+            queue = self.bot.queues.get(guild_id)
+            queued = len(queue) if queue else 0
+            if ctx.voice_client and ctx.voice_client.is_paused():
+                await self.run_command(ctx, 'resume')
+                continue
+            if queued < 2:
+                await self.play(ctx)
+                continue
+
+            name = self.random.choices(names, weights)[0]
+            if name == 'play':
+                await self.play(ctx)
+            elif name == 'volume':
+                await self.run_command(ctx, 'volume', self.random.randint(10, 100))
+            elif name == 'move':
+                await self.run_command(ctx, 'move', self.random.randint(1, queued), self.random.randint(1, queued))
+            elif name == 'remove':
+                await self.run_command(ctx, 'remove', self.random.randint(1, queued))
+            else:
+                await self.run_command(ctx, name)
+
+        self.stats.last_end.pop(guild_id, None)
+        await self.run_command(ctx, 'stop')
+        await self.run_command(ctx, 'leave')
+
+    async def measure_memory(self, guild_count=50):
+        """Bytes held per guild with a full queue of Spotify placeholders, and the queue's own estimate"""
+        from guild_queue import GuildQueue
+
+        tracks = [{'title': f'Memory track {index}', 'artist': 'Artist', 'duration_ms': 180000,
+                   'external_urls': {}, 'album_art': None} for index in range(self.bot.queue_space(-1))]
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        for index in range(guild_count):
+            guild = FakeGuild(10 ** 6 + index, self.stats)
+            self.guilds[guild.id] = guild
+            self.bot.queues[guild.id] = GuildQueue()
+            await self.bot.import_spotify_tracks(FakeContext(guild), tracks)
+        await asyncio.sleep(0.1)
+        used = tracemalloc.get_traced_memory()[0] - before
+        tracemalloc.stop()
+        return used / guild_count, len(tracks), self.bot.queues[guild.id].memory_usage()
+
+    def measure_track_index(self):
+        """Answers to INDEX_PROBES among args.index_size filler tracks, and the time each lookup took"""
+        from track_index import TrackIndex
+
+        rng = random.Random(self.args.seed)
+        syllables = ['ka', 'lo', 'mi', 'ten', 'ru', 'sha', 'vo', 'nel', 'bri', 'dus', 'po', 'zan', 'fe', 'gor']
+
+        def word():
+            return ''.join(rng.choice(syllables) for _ in range(rng.randint(1, 3)))
+
+        index = TrackIndex(os.path.join(self.args.workdir, 'probe_index.db'))
+        rows = [(f'bench://filler/{number}', f"{word()} {word()} - {' '.join(word() for _ in range(rng.randint(1, 4)))}",
+                 180, '', None, 1, json.dumps([]), 0) for number in range(self.args.index_size)]
+        index.db.executemany('INSERT INTO track_index VALUES (?, ?, ?, ?, ?, ?, ?, ?)', rows)
+        asyncio.run(index.load())
+        for url, title, spotify in INDEX_SONGS:
+            spotify_info = {'title': spotify[0], 'artist': spotify[1]} if spotify else None
+            index.record({'webpage_url': url, 'title': title, 'duration': 200}, None, spotify_info)
+
+        answers = []
+        timings = []
+        for query, _ in INDEX_PROBES:
+            started = time.perf_counter()
+            info = index.match(query)
+            timings.append(time.perf_counter() - started)
+            answers.append(info['webpage_url'] if info else None)
+        index.close()
+        return answers, timings
+
+    async def run(self):
+        args = self.args
+        await self.setup()
+
+        cpu_before = os.times()
+        started = time.monotonic()
+        deadline = started + args.ramp + args.duration
+        await asyncio.gather(*(self.simulate_guild(guild_id, deadline) for guild_id in range(1, args.guilds + 1)))
+        await asyncio.sleep(0.2)  # Let the audio threads report their last songs
+        wall = time.monotonic() - started
+        cpu_after = os.times()
+        cpu = (cpu_after.user - cpu_before.user) + (cpu_after.system - cpu_before.system)
+
+        memory_per_guild, queue_length, queue_memory = await self.measure_memory()
+        stalls = list(self.bot.watchdog.reports) if self.bot.watchdog else []
+        # The bot never connected, so only its own subsystems need stopping
+        await self.bot.shutdown()
+
+        stream_seconds = self.stats.frames * FRAME_SECONDS
+        all_latencies = [value for values in self.stats.command_latency.values() for value in values]
+        return {
+            'guilds': args.guilds,
+            'duration': wall,
+            'time_to_first_audio': summarize(self.stats.first_audio),
+            'transition_gap': summarize(self.stats.gaps),
+            'command_latency': summarize(all_latencies),
+            'commands_per_second': self.commands_run / wall,
+            'per_command': {name: summarize(values) for name, values in sorted(self.stats.command_latency.items())},
+            'stream_seconds': stream_seconds,
+            'cpu_seconds': cpu,
+            'cpu_per_stream': cpu / stream_seconds if stream_seconds else None,
+            'memory_per_guild': memory_per_guild,
+            'memory_queue_length': queue_length,
+            'queue_memory_usage': queue_memory,
+            'loop_stalls': len(stalls),
+            'worst_stall': max((stall['duration'] for stall in stalls), default=0),
+        }
+
+    def run_all(self):
+        result = asyncio.run(self.run())
+        answers, timings = self.measure_track_index()
+        result['index_size'] = self.args.index_size
+        result['index_lookup'] = summarize(timings)
+        result['index_probes'] = [{'query': query, 'expected': expected, 'answer': answer}
+                                  for (query, expected), answer in zip(INDEX_PROBES, answers)]
+        return result
+
+
+def measure_startup(runs):
+    """Median time of each startup step over several fresh interpreters"""
+    timings = defaultdict(list)
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, '-c', STARTUP_SCRIPT, json.dumps(STARTUP_STEPS + WARM_UP_STEPS)],
+            cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True, check=True
+        ).stdout
+        for name, seconds in json.loads(output.strip().splitlines()[-1]):
+            timings[name].append(seconds)
+
+    startup = {name: statistics.median(timings[name]) for name, _ in STARTUP_STEPS}
+    warm_up = {name: statistics.median(timings[name]) for name, _ in WARM_UP_STEPS}
+    return {
+        'runs': runs,
+        'startup': startup,
+        'startup_total': sum(startup.values()),
+        'warm_up': warm_up,
+        'warm_up_total': sum(warm_up.values()),
+    }
+
+
+def print_startup_report(result):
+    print(f"\n🚀 Startup benchmark (median of {result['runs']} runs)")
+    print("  Before connecting:")
+    for name, seconds in result['startup'].items():
+        print(f"    {name:<20} {format_seconds(seconds)}")
+    print(f"    {'total':<20} {format_seconds(result['startup_total'])}")
+    print("  Background warm-up after connecting:")
+    for name, seconds in result['warm_up'].items():
+        print(f"    {name:<20} {format_seconds(seconds)}")
+
+
+def format_seconds(value):
+    return f"{value * 1000:7.1f} ms" if value is not None else "      n/a"
+
+
+def print_report(result):
+    print(f"\n🎵 Offline benchmark: {result['guilds']} guilds, {result['duration']:.1f}s")
+    for label, key in (("Time to first audio", 'time_to_first_audio'), ("Transition gap", 'transition_gap'),
+                       ("Command latency", 'command_latency')):
+        summary = result[key]
+        print(f"  {label:<22} p50 {format_seconds(summary['p50'])}  p95 {format_seconds(summary['p95'])}  "
+              f"p99 {format_seconds(summary['p99'])}  max {format_seconds(summary['max'])}  (n={summary['count']})")
+    for name, summary in result['per_command'].items():
+        print(f"    {name:<20} p50 {format_seconds(summary['p50'])}  p95 {format_seconds(summary['p95'])}  "
+              f"(n={summary['count']})")
+    print(f"  Commands per second    {result['commands_per_second']:.1f}")
+    if result['cpu_per_stream'] is not None:
+        print(f"  CPU per stream         {result['cpu_per_stream'] * 100:.2f}% of a core "
+              f"({result['stream_seconds']:.0f} stream-seconds, FFmpeg not included)")
+    print(f"  Memory per guild       {result['memory_per_guild'] / 1024:.1f} KiB "
+          f"({result['memory_queue_length']}-song queue, {result['queue_memory_usage'] / 1024:.1f} KiB "
+          f"by GuildQueue.memory_usage)")
+    print(f"  Event loop stalls      {result['loop_stalls']} (worst {result['worst_stall']:.2f}s)")
+    wrong = [probe for probe in result['index_probes'] if probe['answer'] != probe['expected']]
+    print(f"  Track index probes     {len(result['index_probes']) - len(wrong)}/{len(result['index_probes'])} "
+          f"answered as expected ({result['index_size']} tracks, lookup max "
+          f"{format_seconds(result['index_lookup']['max']).strip()})")
+    for probe in wrong:
+        print(f"    {probe['query']!r}: expected {probe['expected']}, got {probe['answer']}")
+
+
+def check_gates(result, args):
+    """Return the list of release gates the result fails"""
+    failures = []
+    if 'startup' in result:
+        if args.max_startup is not None and result['startup_total'] > args.max_startup:
+            failures.append(f"start-up {result['startup_total']:.3f}s > {args.max_startup:.3f}s")
+        return failures
+    gates = (
+        (args.max_ttfa_p95, result['time_to_first_audio']['p95'], "time to first audio p95"),
+        (args.max_gap_p95, result['transition_gap']['p95'], "transition gap p95"),
+        (args.max_command_p95, result['command_latency']['p95'], "command latency p95"),
+    )
+    for limit, value, label in gates:
+        if limit is not None and value is not None and value > limit:
+            failures.append(f"{label} {value:.3f}s > {limit:.3f}s")
+    if args.max_stalls is not None and result['loop_stalls'] > args.max_stalls:
+        failures.append(f"{result['loop_stalls']} event loop stalls > {args.max_stalls}")
+    for probe in result['index_probes']:
+        if probe['answer'] != probe['expected']:
+            failures.append(f"track index answered {probe['query']!r} with {probe['answer']}")
+    return failures
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Offline benchmark for the music bot")
+    parser.add_argument('--guilds', type=int, default=20, help="simulated guilds")
+    parser.add_argument('--duration', type=float, default=30, help="seconds each guild keeps sending commands")
+    parser.add_argument('--ramp', type=float, default=3, help="seconds over which guilds join")
+    parser.add_argument('--command-rate', type=float, default=0.5, help="commands per second per guild")
+    parser.add_argument('--song-seconds', type=float, default=5, help="length of every fake song")
+    parser.add_argument('--extract-latency', type=float, default=0.3, help="mean fake yt-dlp latency in seconds")
+    parser.add_argument('--jitter', type=float, default=0.5, help="latency spread, as a fraction of the mean")
+    parser.add_argument('--failure-rate', type=float, default=0.0, help="share of fake extractions that fail")
+    parser.add_argument('--spotify-latency', type=float, default=0.1, help="mean fake Spotify API latency")
+    parser.add_argument('--spotify-share', type=float, default=0.2, help="share of plays that are Spotify playlists")
+    parser.add_argument('--playlist-size', type=int, default=50)
+    parser.add_argument('--catalog-size', type=int, default=500, help="distinct songs that can be searched")
+    parser.add_argument('--no-search-cache', dest='search_cache', action='store_false')
+    parser.add_argument('--index-size', type=int, default=30000, help="filler tracks in the track index probe")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', action='store_true', help="print the result as JSON")
+    parser.add_argument('--max-ttfa-p95', type=float, help="fail if time to first audio p95 exceeds this")
+    parser.add_argument('--max-gap-p95', type=float, help="fail if transition gap p95 exceeds this")
+    parser.add_argument('--max-command-p95', type=float, help="fail if command latency p95 exceeds this")
+    parser.add_argument('--max-stalls', type=int, help="fail if more event loop stalls are recorded")
+    parser.add_argument('--startup', action='store_true', help="measure import and start-up time instead")
+    parser.add_argument('--startup-runs', type=int, default=5)
+    parser.add_argument('--max-startup', type=float, help="fail if start-up before connecting takes longer")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    with tempfile.TemporaryDirectory() as workdir:
+        args.workdir = workdir
+        # Keep the benchmark's state away from the real caches and snapshots
+        os.environ.update({
+            'SEARCH_CACHE_PATH': os.path.join(workdir, 'default_search_cache.db'),
+            'TRACK_INDEX_PATH': os.path.join(workdir, 'track_index.db'),
+            'SNAPSHOT_ENABLED': 'false',
+            'AUDIO_CACHE_ENABLED': 'false',
+            'LOUDNESS_ENABLED': 'false',
+            'METRICS_ENABLED': 'false',
+        })
+        if args.startup:
+            result = measure_startup(args.startup_runs)
+        else:
+            random.seed(args.seed)
+            result = Benchmark(args).run_all()
+
+    if args.json:
+        print(json.dumps(result, indent=2))
+    elif args.startup:
+        print_startup_report(result)
+    else:
+        print_report(result)
+
+    failures = check_gates(result, args)
+    for failure in failures:
+        print(f"❌ Gate failed: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
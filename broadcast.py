@@ -0,0 +1,168 @@
+import asyncio
+import threading
+import time
+import discord
+from config import BROADCAST_BUFFER_SECONDS, BROADCAST_LINGER
+from metrics import BROADCAST_DROPPED_FRAMES
+from single_flight import SingleFlight
+
+FRAME_LENGTH = 0.02  # Seconds of audio in each frame read from a source
+JITTER_FRAMES = 10  # How far behind the newest frame listeners start, to ride out uneven reads
+STALL_TIMEOUT = 10  # Seconds a listener waits for the next frame before giving up on the stream
+
+
+class Broadcast:
+    """One audio source read once and played in any number of guilds.
+
+    A reader thread pulls frames from the source in real time into a ring
+    buffer. Each listener keeps its own position in the buffer, so a slow
+    or paused listener only falls behind by itself; once it is more than a
+    buffer behind it skips ahead to the newest frames. The source is closed
+    when it ends or nobody has listened for BROADCAST_LINGER seconds.
+    """
+
+    def __init__(self, source, buffer_seconds=BROADCAST_BUFFER_SECONDS, linger=BROADCAST_LINGER):
+        self.source = source
+        self.on_finished = None  # Called from the reader thread once the source is closed
+        self.linger = linger
+        self.frames = [None] * max(int(buffer_seconds / FRAME_LENGTH), JITTER_FRAMES + 1)
+        self.head = 0  # Sequence number of the next frame to be written
+        self.listeners = 0
+        self.unheard_since = time.monotonic()  # When the last listener left (or the broadcast started)
+        self.finished = False
+        self.stopped = False
+        self.condition = threading.Condition()
+        self.thread = threading.Thread(target=self.run, daemon=True, name='broadcast')
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        """Ask the reader thread to close the source"""
+        self.stopped = True
+
+    def listen(self):
+        """A new listener starting near the newest frame, or None once the broadcast has finished"""
+        with self.condition:
+            if self.finished:
+                return None
+            self.listeners += 1
+            return BroadcastListener(self, max(self.head - JITTER_FRAMES, 0))
+
+    def leave(self):
+        with self.condition:
+            self.listeners -= 1
+            if not self.listeners:
+                self.unheard_since = time.monotonic()
+
+    def run(self):
+        started = time.perf_counter()
+        frames = 0
+        try:
+            while not self.stopped:
+                if not self.listeners and time.monotonic() - self.unheard_since >= self.linger:
+                    break
+                frame = self.source.read()
+                if not frame:
+                    break
+                with self.condition:
+                    self.frames[self.head % len(self.frames)] = frame
+                    self.head += 1
+                    self.condition.notify_all()
+                # Pace reads like discord's audio player, so the buffer holds the last few seconds
+                frames += 1
+                time.sleep(max(started + frames * FRAME_LENGTH - time.perf_counter(), 0))
+        except Exception as e:
+            print(f"Error reading broadcast source: {e}")
+        finally:
+            with self.condition:
+                self.finished = True
+                self.condition.notify_all()
+            self.source.cleanup()
+            if self.on_finished:
+                self.on_finished()
+
+    def read(self, position):
+        """The frame at a listener's position and its next position; an empty frame at the end"""
+        with self.condition:
+            if self.head - position > len(self.frames):
+                # Too far behind, the frames it needs were overwritten
+                skipped_to = self.head - JITTER_FRAMES
+                BROADCAST_DROPPED_FRAMES.inc(amount=skipped_to - position)
+                position = skipped_to
+            deadline = time.monotonic() + STALL_TIMEOUT
+            while position >= self.head and not self.finished:
+                if not self.condition.wait(deadline - time.monotonic()):
+                    return b'', position
+            if position >= self.head:
+                return b'', position
+            return self.frames[position % len(self.frames)], position + 1
+
+
+class BroadcastListener(discord.AudioSource):
+    """A guild's view of a broadcast"""
+
+    def __init__(self, broadcast, position):
+        self.broadcast = broadcast
+        self.position = position
+        self.closed = False
+
+    def read(self):
+        if self.closed:
+            return b''
+        frame, self.position = self.broadcast.read(self.position)
+        return frame
+
+    def is_opus(self):
+        return self.broadcast.source.is_opus()
+
+    def cleanup(self):
+        if not self.closed:
+            self.closed = True
+            self.broadcast.leave()
+
+
+class BroadcastHub:
+    """Running broadcasts by stream, so guilds playing the same live stream share one FFmpeg process"""
+
+    def __init__(self):
+        self.broadcasts = {}  # Stream key -> Broadcast
+        self.flights = SingleFlight('broadcast')  # Guilds joining at the same time start one broadcast
+
+    def __contains__(self, key):
+        broadcast = self.broadcasts.get(key)
+        return broadcast is not None and not broadcast.finished
+
+    async def listen(self, key, open_source):
+        """A listener for the stream's broadcast, starting it with open_source() if none is running"""
+        broadcast = self.broadcasts.get(key)
+        listener = broadcast.listen() if broadcast else None
+        if listener is None:
+            broadcast = await self.flights.run(key, lambda: self._start(key, open_source))
+            listener = broadcast.listen()
+            if listener is None:
+                raise RuntimeError("Broadcast ended before it could be joined")
+        return listener
+
+    async def _start(self, key, open_source):
+        source = await open_source()
+        loop = asyncio.get_running_loop()
+        broadcast = Broadcast(source)
+        broadcast.on_finished = lambda: loop.call_soon_threadsafe(self._finished, key, broadcast)
+        self.broadcasts[key] = broadcast
+        broadcast.start()
+        return broadcast
+
+    def _finished(self, key, broadcast):
+        if self.broadcasts.get(key) is broadcast:
+            del self.broadcasts[key]
+
+    def sources(self):
+        return [broadcast.source for broadcast in self.broadcasts.values()]
+
+    def listener_count(self):
+        return sum(broadcast.listeners for broadcast in self.broadcasts.values())
+
+    def close(self):
+        for broadcast in self.broadcasts.values():
+            broadcast.stop()
@@ -0,0 +1,257 @@
+import asyncio
+import json
+import multiprocessing
+import os
+import queue
+import signal
+import time
+import urllib.request
+from config import (CLUSTER_HEALTH_INTERVAL, CLUSTER_HEARTBEAT_TIMEOUT,
+                    CLUSTER_READY_TIMEOUT, CLUSTER_SHUTDOWN_GRACE, CLUSTER_WORKERS, DISCORD_TOKEN,
+                    SHARD_COUNT)
+
+
+def fetch_recommended_shards(token):
+    """Ask Discord how many shards the bot should run"""
+    request = urllib.request.Request('https://discord.com/api/v10/gateway/bot', headers={
+        'Authorization': f'Bot {token}',
+        'User-Agent': 'DiscordBot (https://github.com/Eroniyom/discord-music-bot, 1.0)'
+    })
+    with urllib.request.urlopen(request, timeout=10) as response:
+        return json.load(response)['shards']
+
+
+def shard_slice(worker_id, workers, shard_count):
+    """Shard IDs run by one worker: an even, contiguous share of all shards"""
+    return list(range(worker_id * shard_count // workers, (worker_id + 1) * shard_count // workers))
+
+
+def worker_health(bot, worker_id):
+    from player import PlayerState
+    return {
+        'worker': worker_id,
+        'pid': os.getpid(),
+        'time': time.time(),
+        'ready': bot.is_ready(),
+        'guilds': len(bot.guilds),
+        'voice': len(bot.voice_clients),
+        'playing': sum(player.state is PlayerState.PLAYING for player in bot.players.values()),
+        'queued': sum(len(guild_queue) for guild_queue in bot.queues.values()),
+        'latency': {shard_id: latency for shard_id, latency in bot.latencies},
+    }
+
+
+def run_worker(worker_id, shard_ids, shard_count, health_queue, stop_event):
+    """Worker process entry point: run one auto-sharded bot for a slice of the shards"""
+    # Ctrl+C reaches every process; the supervisor decides how workers stop
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    from music_bot import MusicBot
+
+    bot = MusicBot(shard_ids=shard_ids, shard_count=shard_count, cluster_worker=worker_id)
+
+    async def supervise():
+        last_report = 0
+        reported_ready = False
+        while not bot.is_closed():
+            if stop_event.is_set():
+                await bot.close()
+                return
+            # Report right away once ready, the supervisor may be waiting for it
+            if time.monotonic() - last_report >= CLUSTER_HEALTH_INTERVAL or bot.is_ready() != reported_ready:
+                last_report = time.monotonic()
+                reported_ready = bot.is_ready()
+                health_queue.put(worker_health(bot, worker_id))
+            await asyncio.sleep(1)
+
+    async def main():
+        async with bot:
+            asyncio.get_running_loop().create_task(supervise())
+            await bot.start(DISCORD_TOKEN)
+
+    asyncio.run(main())
+
+
+class WorkerHandle:
+    __slots__ = ('worker_id', 'shard_ids', 'process', 'stop_event', 'health', 'started_at',
+                 'restarts', 'next_start')
+
+    def __init__(self, worker_id, shard_ids):
+        self.worker_id = worker_id
+        self.shard_ids = shard_ids
+        self.process = None
+        self.stop_event = None
+        self.health = None  # Last report from the current process
+        self.started_at = 0
+        self.restarts = 0  # Crashes in a row, for backoff
+        self.next_start = 0
+
+
+class Cluster:
+    """Runs the bot as several worker processes and keeps them alive.
+
+    Each worker runs an AutoShardedBot for a contiguous slice of the
+    shards. Workers report health through a queue; the supervisor restarts
+    crashed or silent workers with backoff and prints a cluster summary.
+    SIGHUP triggers a rolling restart, one worker at a time, each shutting
+    down gracefully (snapshots are saved and restored by the new process).
+    """
+
+    def __init__(self, workers=CLUSTER_WORKERS, shard_count=SHARD_COUNT):
+        self.worker_count = workers
+        self.shard_count = shard_count
+        self.context = multiprocessing.get_context('spawn')
+        self.health_queue = self.context.Queue()
+        self.workers = []
+        self.total_shards = 0
+        self.restart_requested = False
+        self.last_report = 0
+
+    def run(self):
+        if hasattr(signal, 'SIGHUP'):
+            signal.signal(signal.SIGHUP, lambda *_: setattr(self, 'restart_requested', True))
+        try:
+            self.start()
+            while True:
+                self.drain_health(timeout=1)
+                self.check_workers()
+                if self.restart_requested:
+                    self.restart_requested = False
+                    self.rolling_restart()
+                if time.monotonic() - self.last_report >= CLUSTER_HEALTH_INTERVAL:
+                    self.last_report = time.monotonic()
+                    self.report()
+        except KeyboardInterrupt:
+            print("\n🛑 Stopping cluster...")
+        finally:
+            self.shutdown()
+
+    def start(self):
+        shard_count = self.shard_count
+        if not shard_count:
+            try:
+                shard_count = fetch_recommended_shards(DISCORD_TOKEN)
+            except Exception as e:
+                print(f"Couldn't get the recommended shard count, using one per worker: {e}")
+                shard_count = self.worker_count
+        # Every worker needs at least one shard
+        self.total_shards = max(shard_count, self.worker_count)
+        print(f"🧩 Starting {self.worker_count} workers for {self.total_shards} shards")
+
+        for worker_id in range(self.worker_count):
+            handle = WorkerHandle(worker_id, shard_slice(worker_id, self.worker_count, self.total_shards))
+            self.workers.append(handle)
+            # One worker at a time, so shards don't hit Discord's identify rate limit together
+            self.spawn(handle)
+            self.wait_ready(handle)
+
+    def spawn(self, handle):
+        handle.stop_event = self.context.Event()
+        handle.health = None
+        handle.started_at = time.monotonic()
+        handle.process = self.context.Process(
+            target=run_worker,
+            args=(handle.worker_id, handle.shard_ids, self.total_shards, self.health_queue, handle.stop_event),
+            name=f'music-bot-worker-{handle.worker_id}',
+            daemon=False
+        )
+        handle.process.start()
+        print(f"🚀 Worker {handle.worker_id} (pid {handle.process.pid}) running shards "
+              f"{handle.shard_ids[0]}-{handle.shard_ids[-1]}")
+
+    def drain_health(self, timeout=0):
+        """Read pending health reports, waiting up to timeout for the first one"""
+        while True:
+            try:
+                health = self.health_queue.get(timeout=timeout)
+            except queue.Empty:
+                return
+            timeout = 0
+            handle = self.workers[health['worker']] if health['worker'] < len(self.workers) else None
+            # Ignore late reports from a process that has already been replaced
+            if handle and handle.process and handle.process.pid == health['pid']:
+                handle.health = health
+                if health['ready']:
+                    handle.restarts = 0
+
+    def wait_ready(self, handle):
+        deadline = time.monotonic() + CLUSTER_READY_TIMEOUT
+        while time.monotonic() < deadline and handle.process.is_alive():
+            self.drain_health(timeout=1)
+            if handle.health and handle.health['ready']:
+                return True
+        print(f"⚠️ Worker {handle.worker_id} not ready after {CLUSTER_READY_TIMEOUT}s, continuing")
+        return False
+
+    def check_workers(self):
+        """Restart workers that exited or stopped reporting"""
+        now = time.monotonic()
+        for handle in self.workers:
+            if handle.process.is_alive():
+                last_seen = handle.health['time'] if handle.health else None
+                silent_since = time.time() - last_seen if last_seen else now - handle.started_at
+                if silent_since > CLUSTER_HEARTBEAT_TIMEOUT:
+                    print(f"⚠️ Worker {handle.worker_id} silent for {silent_since:.0f}s, killing it")
+                    handle.process.kill()
+                    handle.process.join()
+                continue
+
+            if not handle.next_start:
+                handle.health = None
+                delay = min(2 ** handle.restarts, 60)
+                handle.restarts += 1
+                handle.next_start = now + delay
+                print(f"❌ Worker {handle.worker_id} exited with code {handle.process.exitcode}, "
+                      f"restarting in {delay}s")
+            elif now >= handle.next_start:
+                handle.next_start = 0
+                self.spawn(handle)
+
+    def stop_worker(self, handle):
+        """Ask a worker to shut down cleanly, killing it after the grace period"""
+        handle.stop_event.set()
+        handle.process.join(CLUSTER_SHUTDOWN_GRACE)
+        if handle.process.is_alive():
+            print(f"⚠️ Worker {handle.worker_id} did not stop in time, terminating it")
+            handle.process.terminate()
+            handle.process.join()
+
+    def rolling_restart(self):
+        """Restart the workers one after another so only one slice of shards is down at a time"""
+        print("🔄 Rolling restart")
+        for handle in self.workers:
+            self.stop_worker(handle)
+            handle.restarts = 0
+            handle.next_start = 0
+            self.spawn(handle)
+            self.wait_ready(handle)
+        print("✅ Rolling restart finished")
+
+    def shutdown(self):
+        for handle in self.workers:
+            if handle.process and handle.process.is_alive():
+                handle.stop_event.set()
+        for handle in self.workers:
+            if handle.process:
+                self.stop_worker(handle)
+
+    def health(self):
+        """Cluster-wide totals from the latest worker reports"""
+        reports = [handle.health for handle in self.workers if handle.health]
+        latencies = [latency for report in reports for latency in report['latency'].values()
+                     if latency == latency and latency != float('inf')]
+        return {
+            'workers': len(self.workers),
+            'ready': sum(report['ready'] for report in reports),
+            'guilds': sum(report['guilds'] for report in reports),
+            'voice': sum(report['voice'] for report in reports),
+            'playing': sum(report['playing'] for report in reports),
+            'queued': sum(report['queued'] for report in reports),
+            'max_latency': max(latencies, default=None),
+        }
+
+    def report(self):
+        health = self.health()
+        latency = f"{health['max_latency'] * 1000:.0f} ms" if health['max_latency'] is not None else "n/a"
+        print(f"🩺 Cluster: {health['ready']}/{health['workers']} workers ready | {health['guilds']} guilds | "
+              f"{health['voice']} voice | {health['playing']} playing | {health['queued']} queued | "
+              f"worst shard latency {latency}")
@@ -11,11 +11,116 @@ YOUTUBE_API_KEY = os.getenv('YOUTUBE_API_KEY')
 # Spotify Configuration
 SPOTIFY_CLIENT_ID = os.getenv('SPOTIFY_CLIENT_ID')
 SPOTIFY_CLIENT_SECRET = os.getenv('SPOTIFY_CLIENT_SECRET')
+SPOTIFY_REQUEST_TIMEOUT = 10  # seconds per Web API request
+SPOTIFY_MAX_RETRIES = 3  # retries for rate-limited (429) or failed (5xx) requests
+SPOTIFY_TOKEN_REFRESH_MARGIN = 300  # seconds before expiry to refresh the access token
+SPOTIFY_CACHE_TTL = int(os.getenv('SPOTIFY_CACHE_TTL', 24 * 3600))  # seconds for track/album/playlist metadata
+SPOTIFY_CACHE_MAX_ENTRIES = 5000
+SPOTIFY_PLAYLIST_RECHECK_INTERVAL = 60  # seconds before a cached playlist's snapshot_id is checked again
+RESOLVE_AHEAD = int(os.getenv('RESOLVE_AHEAD', 3))  # queued Spotify tracks looked up on YouTube ahead of playback
 
 # Music Configuration
-MAX_QUEUE_SIZE = 50
+MAX_QUEUE_SIZE = int(os.getenv('MAX_QUEUE_SIZE', 50))
 MAX_SONG_LENGTH = 600  # 10 minutes in seconds
-DEFAULT_VOLUME = 0.5
+DEFAULT_VOLUME = 1.0  # songs at 100% keep Opus passthrough unless their loudness is corrected
+PROGRESS_EDIT_INTERVAL = 1.5  # minimum seconds between edits of a status message
+
+# Player Configuration (per-guild playback actor)
+PLAYER_MAX_RETRIES = int(os.getenv('PLAYER_MAX_RETRIES', 2))  # extra attempts to open a song's stream
+PLAYER_RETRY_BACKOFF = 1.0  # seconds before the first retry, doubled for each further one
+PLAYER_MAX_CONSECUTIVE_FAILURES = 5  # failed songs in a row before playback stops
+
+# Voice Session Limits
+VOICE_EMPTY_PAUSE_AFTER = int(os.getenv('VOICE_EMPTY_PAUSE_AFTER', 30))  # seconds alone in a channel before pausing
+VOICE_EMPTY_LEAVE_AFTER = int(os.getenv('VOICE_EMPTY_LEAVE_AFTER', 300))  # seconds alone in a channel before leaving
+VOICE_IDLE_LEAVE_AFTER = int(os.getenv('VOICE_IDLE_LEAVE_AFTER', 600))  # seconds with nothing playing before leaving
+REAPER_INTERVAL = 15  # seconds between checks for unused voice sessions
+MAX_VOICE_SESSIONS = int(os.getenv('MAX_VOICE_SESSIONS', 0))  # per process, 0 for no limit
+MAX_FFMPEG_PROCESSES = int(os.getenv('MAX_FFMPEG_PROCESSES', 0))  # per process, 0 for no limit
+
+# Snapshot Configuration (queues and playback state kept across restarts)
+SNAPSHOT_ENABLED = os.getenv('SNAPSHOT_ENABLED', 'true').lower() == 'true'
+SNAPSHOT_DIR = os.getenv('SNAPSHOT_DIR', 'cache/snapshots')
+SNAPSHOT_INTERVAL = int(os.getenv('SNAPSHOT_INTERVAL', 15))  # seconds between saves of changed guilds
+SNAPSHOT_MAX_AGE = 6 * 3600  # seconds, older snapshots are discarded on startup
+SNAPSHOT_RESTORE_CONCURRENCY = 2  # guilds resuming playback at the same time after a restart
+
+# Cluster Configuration (several worker processes, each running a slice of the shards)
+CLUSTER_WORKERS = int(os.getenv('CLUSTER_WORKERS', 0))  # 0 or 1 runs the bot in a single process
+SHARD_COUNT = int(os.getenv('SHARD_COUNT', 0))  # 0 uses the shard count Discord recommends
+CLUSTER_HEALTH_INTERVAL = 10  # seconds between worker health reports
+CLUSTER_HEARTBEAT_TIMEOUT = 60  # seconds without a report before a worker is restarted
+CLUSTER_READY_TIMEOUT = 120  # seconds to wait for a (re)started worker before moving on
+CLUSTER_SHUTDOWN_GRACE = 30  # seconds a worker gets to save state and disconnect
+
+# Metrics Configuration (Prometheus text format over HTTP)
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'false').lower() == 'true'
+METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')
+METRICS_PORT = int(os.getenv('METRICS_PORT', 9108))  # cluster workers use METRICS_PORT + worker number
+
+# Watchdog Configuration (event loop stall detection and sampling profiler)
+WATCHDOG_ENABLED = os.getenv('WATCHDOG_ENABLED', 'true').lower() == 'true'
+WATCHDOG_THRESHOLD = float(os.getenv('WATCHDOG_THRESHOLD', 0.25))  # seconds the loop may lag before a stall is reported
+WATCHDOG_MAX_REPORTS = 20  # recent stalls kept for !lag
+PROFILE_INTERVAL = 0.005  # seconds between profiler samples
+PROFILE_MAX_SECONDS = 60
+
+# Resolver Configuration (yt-dlp extraction pool)
+RESOLVER_WORKERS = int(os.getenv('RESOLVER_WORKERS', 4))
+RESOLVER_TIMEOUT = float(os.getenv('RESOLVER_TIMEOUT', 20))  # seconds per extraction
+RESOLVER_USE_PROCESSES = os.getenv('RESOLVER_USE_PROCESSES', 'false').lower() == 'true'
+RESOLVER_GUILD_RATE = float(os.getenv('RESOLVER_GUILD_RATE', 1))  # background lookups per second per guild
+RESOLVER_GUILD_BURST = int(os.getenv('RESOLVER_GUILD_BURST', 5))  # background lookups a guild can make at once
+RESOLVER_INTERACTIVE_WEIGHT = int(os.getenv('RESOLVER_INTERACTIVE_WEIGHT', 4))  # command lookups let through per background one
+WARM_UP_DELAY = 2  # seconds after connecting before yt-dlp and Spotify are loaded in the background
+
+# Search Cache Configuration (resolved query metadata)
+SEARCH_CACHE_PATH = os.getenv('SEARCH_CACHE_PATH', 'cache/search_cache.db')
+SEARCH_CACHE_TTL = int(os.getenv('SEARCH_CACHE_TTL', 7 * 24 * 3600))  # seconds
+SEARCH_CACHE_MAX_ENTRIES = int(os.getenv('SEARCH_CACHE_MAX_ENTRIES', 50000))
+
+# Track Index Configuration (local fuzzy search over requested songs)
+TRACK_INDEX_ENABLED = os.getenv('TRACK_INDEX_ENABLED', 'true').lower() == 'true'
+TRACK_INDEX_PATH = os.getenv('TRACK_INDEX_PATH', 'cache/track_index.db')
+TRACK_INDEX_MAX_ENTRIES = int(os.getenv('TRACK_INDEX_MAX_ENTRIES', 50000))
+TRACK_INDEX_MIN_SCORE = float(os.getenv('TRACK_INDEX_MIN_SCORE', 0.8))  # word overlap needed to skip the YouTube search
+
+# Stream Configuration (direct stream URLs and next-track pre-resolution)
+STREAM_CACHE_DEFAULT_TTL = 1800  # seconds, for URLs without an embedded expiry
+STREAM_CACHE_SAFETY_MARGIN = 120  # seconds, don't hand out URLs this close to expiring
+STREAM_CACHE_MAX_ENTRIES = 5000
+PRESPAWN_FFMPEG = os.getenv('PRESPAWN_FFMPEG', 'false').lower() == 'true'
+OPUS_PASSTHROUGH = os.getenv('OPUS_PASSTHROUGH', 'true').lower() == 'true'  # copy Opus streams instead of transcoding
+BROADCAST_ENABLED = os.getenv('BROADCAST_ENABLED', 'true').lower() == 'true'  # share one FFmpeg process per live stream
+BROADCAST_BUFFER_SECONDS = float(os.getenv('BROADCAST_BUFFER_SECONDS', 5))  # how far a listener may fall behind
+BROADCAST_LINGER = 2  # seconds a live stream keeps running after its last listener leaves
+
+# Loudness Normalization (per-track gain measured once with FFmpeg)
+LOUDNESS_ENABLED = os.getenv('LOUDNESS_ENABLED', 'false').lower() == 'true'
+LOUDNESS_CACHE_PATH = os.getenv('LOUDNESS_CACHE_PATH', 'cache/loudness.db')
+LOUDNESS_TARGET = float(os.getenv('LOUDNESS_TARGET', -14))  # integrated loudness (LUFS) tracks are brought to
+LOUDNESS_MAX_GAIN_DB = 12  # largest boost or cut applied to a track
+LOUDNESS_MIN_GAIN_DB = float(os.getenv('LOUDNESS_MIN_GAIN_DB', 1.5))  # smaller corrections are skipped to keep passthrough
+LOUDNESS_ANALYSIS_TIMEOUT = 120  # seconds per track
+LOUDNESS_WORKERS = 2  # tracks measured at once
+
+# Audio Cache Configuration (downloaded tracks played from disk)
+AUDIO_CACHE_ENABLED = os.getenv('AUDIO_CACHE_ENABLED', 'false').lower() == 'true'
+AUDIO_CACHE_DIR = os.getenv('AUDIO_CACHE_DIR', 'cache/audio')
+AUDIO_CACHE_MAX_BYTES = int(os.getenv('AUDIO_CACHE_MAX_MB', 2048)) * 1024 * 1024
+AUDIO_CACHE_DOWNLOAD_AHEAD = int(os.getenv('AUDIO_CACHE_DOWNLOAD_AHEAD', 2))  # queued songs downloaded in advance
+AUDIO_CACHE_DOWNLOAD_WORKERS = 2
+AUDIO_CACHE_DOWNLOAD_TIMEOUT = 300  # seconds per download
+
+# Audio Format Selection
+# target_kbps: preferred stream bitrate (also used when transcoding to Opus)
+# max_kbps: streams above this are only used when nothing smaller exists
+BANDWIDTH_PROFILES = {
+    'low': {'target_kbps': 64, 'max_kbps': 80},
+    'standard': {'target_kbps': 96, 'max_kbps': 128},
+    'high': {'target_kbps': 128, 'max_kbps': 160},
+}
+AUDIO_PROFILE = os.getenv('AUDIO_PROFILE', 'standard')
 
 # Bot Settings
 BOT_NAME = "MusicBot"
@@ -34,9 +139,13 @@ ERROR_MESSAGES = {
     'song_too_long': f'❌ Song is too long! Maximum length is {MAX_SONG_LENGTH // 60} minutes.',
     'queue_full': f'❌ Queue is full! Maximum {MAX_QUEUE_SIZE} songs allowed.',
     'invalid_volume': '❌ Volume must be between 0 and 100!',
+    'invalid_position': '❌ That position is not in the queue!',
+    'not_owner': '❌ Only the bot owner can use this command!',
+    'too_many_sessions': '❌ I\'m playing in too many voice channels right now, please try again later!',
+    'too_busy': f'❌ I\'m too busy to start another song right now. Your queue was kept, use {DISCORD_PREFIX}resume to try again.',
+    'too_many_failures': f'❌ {PLAYER_MAX_CONSECUTIVE_FAILURES} songs in a row failed to play, so playback was stopped.',
     'no_results': '❌ No results found for your search!',
     'spotify_not_configured': '❌ Spotify API not configured. Please add SPOTIFY_CLIENT_ID and SPOTIFY_CLIENT_SECRET to your .env file.',
     'spotify_invalid_link': '❌ Invalid Spotify link!',
-    'spotify_playlist_too_large': '❌ Playlist is too large! Maximum 20 songs can be added at once.',
-    'spotify_album_too_large': '❌ Album is too large! Maximum 20 songs can be added at once.'
+    'resolver_timeout': '❌ The search took too long, please try again!'
 }
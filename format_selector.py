@@ -0,0 +1,49 @@
+from config import AUDIO_PROFILE, BANDWIDTH_PROFILES
+
+# Higher is better
+CODEC_RANK = {'opus': 3, 'vorbis': 2, 'mp4a': 1, 'aac': 1}
+PROTOCOL_RANK = {'https': 3, 'http': 3, 'm3u8_native': 1, 'm3u8': 1}
+
+
+def get_profile(name=AUDIO_PROFILE):
+    """Return the bandwidth profile settings, falling back to 'standard'"""
+    return BANDWIDTH_PROFILES.get(name, BANDWIDTH_PROFILES['standard'])
+
+
+def get_bitrate(audio_format):
+    """Audio bitrate of a format in kbps (0 when yt-dlp doesn't know it)"""
+    return audio_format.get('abr') or audio_format.get('tbr') or 0
+
+
+def format_rank(audio_format, profile):
+    """Sort key for a yt-dlp format; the best format has the largest key.
+
+    Criteria, in order: audio-only streams first, then protocols FFmpeg
+    can read directly, then bitrates within the profile ceiling, then
+    codec (Opus can be passed straight through to Discord), then the
+    bitrate closest to the profile target.
+    """
+    acodec = (audio_format.get('acodec') or 'unknown').split('.')[0]
+    vcodec = audio_format.get('vcodec') or 'none'
+    bitrate = get_bitrate(audio_format)
+
+    return (
+        vcodec == 'none',
+        PROTOCOL_RANK.get(audio_format.get('protocol', 'https'), 0),
+        bitrate <= profile['max_kbps'],
+        CODEC_RANK.get(acodec, 0),
+        -abs(bitrate - profile['target_kbps']) if bitrate else -profile['target_kbps'],
+    )
+
+
+def select_audio_format(info, profile_name=AUDIO_PROFILE):
+    """Pick the best playable audio format from a yt-dlp info dict"""
+    profile = get_profile(profile_name)
+    candidates = [
+        audio_format for audio_format in info.get('formats') or []
+        if audio_format.get('url') and audio_format.get('acodec') != 'none'
+    ]
+    if not candidates:
+        # Single-format extractors put the stream directly on the info dict
+        return info
+    return max(candidates, key=lambda audio_format: format_rank(audio_format, profile))
@@ -0,0 +1,81 @@
+import random
+import sys
+from collections import deque
+from itertools import islice
+
+
+class GuildQueue:
+    """Per-guild song queue backed by a deque.
+
+    Adding at either end and taking the next song are O(1); indexed
+    operations cost O(distance from the nearest end). ``version`` is bumped
+    on every change so snapshots can tell whether the queue needs saving.
+    """
+
+    __slots__ = ('tracks', 'version')
+
+    def __init__(self, tracks=()):
+        self.tracks = deque(tracks)
+        self.version = 0
+
+    def __len__(self):
+        return len(self.tracks)
+
+    def __bool__(self):
+        return bool(self.tracks)
+
+    def __iter__(self):
+        return iter(self.tracks)
+
+    def __getitem__(self, index):
+        return self.tracks[index]
+
+    def append(self, track):
+        self.tracks.append(track)
+        self.version += 1
+
+    def appendleft(self, track):
+        self.tracks.appendleft(track)
+        self.version += 1
+
+    def popleft(self):
+        """Remove and return the next track"""
+        self.version += 1
+        return self.tracks.popleft()
+
+    def peek(self, index=0):
+        """Return the track at an index without removing it, or None"""
+        if -len(self.tracks) <= index < len(self.tracks):
+            return self.tracks[index]
+        return None
+
+    def head(self, count):
+        """Return the first ``count`` tracks as a list"""
+        return list(islice(self.tracks, count))
+
+    def remove(self, index):
+        """Remove and return the track at an index"""
+        track = self.tracks[index]
+        del self.tracks[index]
+        self.version += 1
+        return track
+
+    def move(self, source, destination):
+        """Move the track at ``source`` so it ends up at ``destination``"""
+        track = self.remove(source)
+        self.tracks.insert(destination, track)
+        return track
+
+    def shuffle(self):
+        tracks = list(self.tracks)
+        random.shuffle(tracks)
+        self.tracks = deque(tracks)
+        self.version += 1
+
+    def clear(self):
+        self.tracks.clear()
+        self.version += 1
+
+    def memory_usage(self):
+        """Approximate bytes held by the queue and its tracks"""
+        return sys.getsizeof(self.tracks) + sum(track.memory_usage() for track in self.tracks)
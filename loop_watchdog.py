@@ -0,0 +1,129 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+from collections import Counter, deque
+from config import PROFILE_INTERVAL, WATCHDOG_MAX_REPORTS, WATCHDOG_THRESHOLD
+from metrics import LOOP_LAG
+
+
+def frame_name(frame, line=True):
+    code = frame.f_code
+    lineno = frame.f_lineno if line else code.co_firstlineno
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{lineno})"
+
+
+def stack_of(frame, line=True):
+    """Frames from the outermost call to the innermost, as a tuple of names"""
+    names = []
+    while frame is not None:
+        names.append(frame_name(frame, line))
+        frame = frame.f_back
+    return tuple(reversed(names))
+
+
+def current_task_name(loop):
+    """Name of the task running on a loop, safe to call from another thread"""
+    try:
+        task = asyncio.current_task(loop)
+    except RuntimeError:
+        return None
+    return task.get_name() if task else None
+
+
+class LoopWatchdog:
+    """Detects event loop stalls from a background thread.
+
+    A coroutine on the loop records a heartbeat every beat_interval; when
+    the thread sees the heartbeat fall more than threshold behind, it
+    samples the loop thread's stack until the loop recovers, then keeps a
+    report with the stall's duration, the task that was running and its
+    most frequent stack.
+    """
+
+    def __init__(self, threshold=WATCHDOG_THRESHOLD, beat_interval=0.1, max_reports=WATCHDOG_MAX_REPORTS):
+        self.threshold = threshold
+        self.beat_interval = beat_interval
+        self.reports = deque(maxlen=max_reports)
+        self.loop = None
+        self.loop_thread_id = None
+        self.last_beat = time.monotonic()
+        self.stopped = threading.Event()
+        self.beat_task = None
+        self.thread = None
+
+    def start(self):
+        """Start watching the running loop"""
+        self.loop = asyncio.get_running_loop()
+        self.loop_thread_id = threading.get_ident()
+        self.last_beat = time.monotonic()
+        self.beat_task = self.loop.create_task(self.beat())
+        self.thread = threading.Thread(target=self.watch, name='loop-watchdog', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        if self.beat_task:
+            self.beat_task.cancel()
+
+    async def beat(self):
+        while True:
+            started = self.loop.time()
+            await asyncio.sleep(self.beat_interval)
+            LOOP_LAG.observe(max(self.loop.time() - started - self.beat_interval, 0))
+            self.last_beat = time.monotonic()
+
+    def watch(self):
+        stall = None
+        while not self.stopped.wait(self.beat_interval / 2):
+            behind = time.monotonic() - self.last_beat - self.beat_interval
+            if behind >= self.threshold:
+                if stall is None:
+                    stall = {'started': time.time() - behind, 'task': current_task_name(self.loop),
+                             'samples': Counter()}
+                frame = sys._current_frames().get(self.loop_thread_id)
+                if frame is not None:
+                    stall['samples'][stack_of(frame)] += 1
+            elif stall is not None:
+                self.record(stall)
+                stall = None
+
+    def record(self, stall):
+        duration = time.time() - stall['started']
+        stack = stall['samples'].most_common(1)[0][0] if stall['samples'] else ()
+        report = {
+            'time': stall['started'],
+            'duration': duration,
+            'task': stall['task'],
+            'stack': stack,
+            'samples': sum(stall['samples'].values()),
+        }
+        self.reports.append(report)
+        where = stack[-1] if stack else 'unknown'
+        print(f"⚠️ Event loop blocked for {duration:.2f}s in task {report['task']!r} at {where}")
+        for name in stack[-8:]:
+            print(f"    {name}")
+
+
+class SamplingProfiler:
+    """Samples one thread's stack at a fixed interval and folds the results.
+
+    The output is the 'folded stacks' format (frames joined by ';' and a
+    sample count per line) read by flamegraph.pl, speedscope and friends.
+    """
+
+    def __init__(self, thread_id, interval=PROFILE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+
+    def run(self, seconds):
+        """Blocking; sample for the given time and return the folded stacks"""
+        samples = Counter()
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                samples[stack_of(frame, line=False)] += 1
+            time.sleep(self.interval)
+        return '\n'.join(f"{';'.join(stack)} {count}" for stack, count in samples.most_common()) + '\n'
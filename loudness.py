@@ -0,0 +1,149 @@
+import asyncio
+import audioop
+import json
+import math
+import os
+import shlex
+import sqlite3
+import time
+import discord
+from config import (LOUDNESS_ANALYSIS_TIMEOUT, LOUDNESS_CACHE_PATH, LOUDNESS_MAX_GAIN_DB, LOUDNESS_MIN_GAIN_DB,
+                    LOUDNESS_TARGET, LOUDNESS_WORKERS)
+
+TRUE_PEAK_CEILING = -1.0  # dBTP a boosted track may reach before it would clip
+MAX_SCALE = 4.0  # Largest volume x gain applied to PCM, about +12 dB at full volume
+
+
+class GainTransformer(discord.PCMVolumeTransformer):
+    """Volume transformer that also applies a track's loudness gain, in the same multiplication"""
+
+    def __init__(self, original, volume=1.0, gain=1.0):
+        super().__init__(original, volume)
+        self.gain = gain
+
+    def read(self):
+        ret = self.original.read()
+        return audioop.mul(ret, 2, min(self.volume * self.gain, MAX_SCALE))
+
+
+class LoudnessCache:
+    """Per-track loudness, measured once with FFmpeg and kept in SQLite.
+
+    A track is measured in the background before it plays, with the first
+    pass of FFmpeg's loudnorm filter. Playback then only applies the stored
+    gain, instead of running loudnorm on every play. Gains too small to
+    hear are reported as 1.0, so those Opus streams are still copied
+    without re-encoding. Measurements are read into memory by load(), which
+    the bot runs during its background warm-up; until then tracks play
+    without a gain and nothing is measured.
+    """
+
+    def __init__(self, path=LOUDNESS_CACHE_PATH, target=LOUDNESS_TARGET, max_gain_db=LOUDNESS_MAX_GAIN_DB,
+                 min_gain_db=LOUDNESS_MIN_GAIN_DB, timeout=LOUDNESS_ANALYSIS_TIMEOUT, workers=LOUDNESS_WORKERS):
+        self.target = target
+        self.max_gain_db = max_gain_db
+        self.min_gain_db = min_gain_db
+        self.timeout = timeout
+        self.workers = workers
+        self.analyses = {}  # Webpage URL -> analysis task
+        self.running = 0  # FFmpeg processes measuring right now
+        self.slots = None  # Measurements running at once; created lazily so it binds to the running loop
+        self.measured = {}  # Webpage URL -> (loudness, true peak), both None for silence
+        self.loaded = False
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.db = sqlite3.connect(path)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS loudness (
+                webpage_url TEXT PRIMARY KEY,
+                loudness REAL,
+                true_peak REAL,
+                analyzed_at REAL NOT NULL
+            )
+        """)
+        self.db.commit()
+
+    async def load(self):
+        """Read the stored measurements into memory, so playing a track never queries SQLite"""
+        if self.loaded:
+            return
+        for webpage_url, loudness, true_peak in self.db.execute(
+                'SELECT webpage_url, loudness, true_peak FROM loudness').fetchall():
+            self.measured[webpage_url] = (loudness, true_peak)
+        self.loaded = True
+
+    def gain(self, webpage_url):
+        """Linear gain bringing a track to the target loudness; 1.0 when unknown or negligible"""
+        loudness, true_peak = self.measured.get(webpage_url, (None, None))
+        if loudness is None:
+            return 1.0
+        gain_db = min(self.target - loudness, TRUE_PEAK_CEILING - true_peak)
+        gain_db = max(-self.max_gain_db, min(gain_db, self.max_gain_db))
+        if abs(gain_db) < self.min_gain_db:
+            return 1.0
+        return 10 ** (gain_db / 20)
+
+    def contains(self, webpage_url):
+        return webpage_url in self.measured
+
+    def schedule(self, webpage_url, stream, before_options=''):
+        """Measure a track in the background unless it is measured or being measured already"""
+        if not self.loaded or webpage_url in self.analyses or self.contains(webpage_url):
+            return
+        if self.slots is None:
+            self.slots = asyncio.BoundedSemaphore(self.workers)
+        task = asyncio.get_running_loop().create_task(self._analyze(webpage_url, stream, before_options))
+        self.analyses[webpage_url] = task
+        task.add_done_callback(lambda _: self.analyses.pop(webpage_url, None))
+
+    async def _analyze(self, webpage_url, stream, before_options):
+        async with self.slots:
+            process = None
+            self.running += 1
+            try:
+                process = await asyncio.create_subprocess_exec(
+                    'ffmpeg', '-hide_banner', '-nostats', *shlex.split(before_options), '-i', stream['url'],
+                    '-vn', '-af', 'loudnorm=print_format=json', '-f', 'null', '-',
+                    stdin=asyncio.subprocess.DEVNULL, stdout=asyncio.subprocess.DEVNULL,
+                    stderr=asyncio.subprocess.PIPE
+                )
+                _, stderr = await asyncio.wait_for(process.communicate(), self.timeout)
+            except asyncio.TimeoutError:
+                print(f"Loudness analysis timed out for {webpage_url}")
+                return
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Error analysing loudness: {e}")
+                return
+            finally:
+                self.running -= 1
+                if process and process.returncode is None:
+                    process.kill()
+                    await process.wait()
+
+        output = stderr.decode(errors='replace')
+        try:
+            # loudnorm prints its measurements as the last JSON object in the log
+            measured = json.loads(output[output.rindex('{'):output.rindex('}') + 1])
+            loudness = float(measured['input_i'])
+            true_peak = float(measured['input_tp'])
+        except (ValueError, KeyError) as e:
+            print(f"Error reading loudness of {webpage_url}: {e}")
+            return
+        if not (math.isfinite(loudness) and math.isfinite(true_peak)):
+            # Silence; leave it as it is
+            loudness = true_peak = None
+        self.measured[webpage_url] = (loudness, true_peak)
+        self.db.execute('INSERT OR REPLACE INTO loudness VALUES (?, ?, ?, ?)',
+                        (webpage_url, loudness, true_peak, time.time()))
+        self.db.commit()
+
+    def close(self):
+        for task in list(self.analyses.values()):
+            task.cancel()
+        self.db.close()
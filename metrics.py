@@ -0,0 +1,194 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from config import METRICS_HOST, METRICS_PORT
+
+# Seconds; covers cache hits (ms) up to slow yt-dlp extractions
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60)
+
+REGISTRY = {}  # Metric name -> metric, in registration order
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(labelnames, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.lock = threading.Lock()  # Observed from executor and audio threads too
+        REGISTRY[name] = self
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        lines.extend(self.samples())
+        return '\n'.join(lines)
+
+    def samples(self):
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self.values = {}
+
+    def inc(self, *labels, amount=1):
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def samples(self):
+        with self.lock:
+            values = list(self.values.items())
+        return [f'{self.name}{_labels(self.labelnames, labels)} {_number(value)}' for labels, value in values]
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+        self.values = {}  # Label values -> [per-bucket counts (last is +Inf), sum, count]
+
+    def observe(self, value, *labels):
+        with self.lock:
+            entry = self.values.get(labels)
+            if entry is None:
+                entry = self.values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][bisect.bisect_left(self.buckets, value)] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    @contextmanager
+    def time(self, *labels):
+        """Observe how long the with-block takes, including awaits inside it"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *labels)
+
+    def samples(self):
+        with self.lock:
+            values = [(labels, list(counts), total, count) for labels, (counts, total, count) in self.values.items()]
+
+        lines = []
+        for labels, counts, total, count in values:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                le = f'le="{_number(bound)}"'
+                lines.append(f'{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}')
+            lines.append(f'{self.name}_sum{_labels(self.labelnames, labels)} {_number(total)}')
+            lines.append(f'{self.name}_count{_labels(self.labelnames, labels)} {count}')
+        return lines
+
+
+class Gauge(Metric):
+    """Value read at scrape time from a callback.
+
+    The callback returns a number, or a dict of label-value tuples to
+    numbers for labelled gauges.
+    """
+
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, callback, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self.callback = callback
+
+    def samples(self):
+        try:
+            value = self.callback()
+        except Exception as e:
+            print(f"Error reading gauge {self.name}: {e}")
+            return []
+        if not isinstance(value, dict):
+            value = {(): value}
+        return [f'{self.name}{_labels(self.labelnames, labels)} {_number(v)}' for labels, v in value.items()]
+
+
+def render():
+    """All metrics in the Prometheus text exposition format"""
+    return '\n'.join(metric.render() for metric in list(REGISTRY.values())) + '\n'
+
+
+def on_first_read(source, callback):
+    """Call callback once, from the audio thread, when the source yields its first frame"""
+    read = source.read
+
+    def first_read():
+        data = read()
+        source.read = read
+        callback()
+        return data
+
+    source.read = first_read
+    return source
+
+
+class MetricsServer:
+    """Serves /metrics over HTTP; binds to localhost unless configured otherwise"""
+
+    def __init__(self, host=METRICS_HOST, port=METRICS_PORT):
+        self.host = host
+        self.port = port
+        self.runner = None
+
+    async def start(self):
+        from aiohttp import web  # Only needed when metrics are enabled
+        app = web.Application()
+        app.router.add_get('/metrics', self.handle)
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, self.host, self.port).start()
+        print(f"📈 Metrics on http://{self.host}:{self.port}/metrics")
+
+    async def handle(self, request):
+        from aiohttp import web
+        return web.Response(text=render(), content_type='text/plain', charset='utf-8')
+
+    async def close(self):
+        if self.runner:
+            await self.runner.cleanup()
+            self.runner = None
+
+
+YTDLP_LATENCY = Histogram('musicbot_ytdlp_seconds', 'yt-dlp extraction time', ['operation'])
+YTDLP_TIMEOUTS = Counter('musicbot_ytdlp_timeouts_total', 'yt-dlp extractions that timed out', ['operation'])
+SPOTIFY_LATENCY = Histogram('musicbot_spotify_request_seconds', 'Spotify Web API request time, including retries',
+                            ['endpoint'])
+SPOTIFY_ERRORS = Counter('musicbot_spotify_errors_total', 'Spotify Web API requests that failed', ['endpoint'])
+COALESCED_LOOKUPS = Counter('musicbot_coalesced_lookups_total',
+                            'Lookups that joined an identical one already in flight', ['kind'])
+BROADCAST_DROPPED_FRAMES = Counter('musicbot_broadcast_dropped_frames_total',
+                                   'Frames a broadcast listener skipped after falling too far behind')
+COMMAND_LATENCY = Histogram('musicbot_command_seconds', 'Time to handle a command', ['command'])
+FIRST_AUDIO_LATENCY = Histogram('musicbot_play_to_first_audio_seconds',
+                                'Time from a command that started playback to its first audio frame')
+TRACK_START_LATENCY = Histogram('musicbot_track_start_seconds',
+                                'Time from starting to load a song to its first audio frame')
+PLAYBACK_FAILURES = Counter('musicbot_playback_failures_total', 'Songs skipped because they failed to play')
+LOOP_LAG = Histogram('musicbot_event_loop_lag_seconds', 'How late the event loop runs a scheduled wake-up',
+                     buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5))
@@ -1,17 +1,40 @@
 import discord
 from discord.ext import commands
 import asyncio
-import yt_dlp
+import io
 import os
 import re
+import threading
+import time
 from config import *
 from spotify_handler import SpotifyHandler
+from resolver import YTDLResolver, ResolverTimeout
+from search_cache import SearchCache
+from track_index import TrackIndex
+from stream_cache import StreamCache
+from format_selector import select_audio_format, get_profile
+from audio_cache import AudioCache
+from track import Track, format_duration
+from guild_queue import GuildQueue
+from progress import ProgressMessage
+from player import CapacityReached, GuildPlayer, PlayerClosed, PlayerState
+from snapshot import SnapshotStore
+from reaper import VoiceReaper
+from broadcast import BroadcastHub, BroadcastListener
+from loudness import GainTransformer, LoudnessCache
+from single_flight import video_key
+from metrics import COMMAND_LATENCY, Gauge, MetricsServer
+from loop_watchdog import LoopWatchdog, SamplingProfiler
 
-# Suppress noise about console usage from errors
-yt_dlp.utils.bug_reports_message = lambda: ''
+def worker_path(path, worker):
+    """A cluster worker's own copy of a cache path, e.g. cache/search_cache-1.db for worker 1"""
+    if worker is None:
+        return path
+    root, ext = os.path.splitext(path)
+    return f'{root}-{worker}{ext}'
 
-class MusicBot(commands.Bot):
-    def __init__(self):
+class MusicBot(commands.AutoShardedBot):
+    def __init__(self, shard_ids=None, shard_count=None, cluster_worker=None):
         intents = discord.Intents.default()
         intents.message_content = True
         intents.voice_states = True
@@ -19,13 +42,39 @@ class MusicBot(commands.Bot):
         super().__init__(
             command_prefix=DISCORD_PREFIX,
             intents=intents,
-            description=BOT_DESCRIPTION
+            description=BOT_DESCRIPTION,
+            shard_ids=shard_ids,
+            shard_count=shard_count
         )
         
-        self.queues = {}  # Guild ID -> List of songs
-        self.current_song = {}  # Guild ID -> Current song info
-        self.voice_clients = {}  # Guild ID -> Voice client
+        self.queues = {}  # Guild ID -> GuildQueue of Tracks
+        self.current_song = {}  # Guild ID -> Current Track
+        self.players = {}  # Guild ID -> GuildPlayer
         self.spotify_handler = SpotifyHandler()  # Spotify API handler
+        # Cluster workers each keep their own SQLite files, so they never wait on each other's write locks
+        search_cache = SearchCache(worker_path(SEARCH_CACHE_PATH, cluster_worker))
+        self.resolver = YTDLResolver(self.get_ytdl_options(), cache=search_cache)  # yt-dlp worker pool
+        self.stream_cache = StreamCache()  # Webpage URL -> direct stream URL
+        self.track_index = TrackIndex(worker_path(TRACK_INDEX_PATH, cluster_worker)) if TRACK_INDEX_ENABLED else None  # Fuzzy search over requested songs
+        self.prefetch_tasks = {}  # Guild ID -> Next song pre-resolution task
+        self.prepared_sources = {}  # Guild ID -> (Next Track, pre-spawned FFmpeg source, (pcm, gain) it was opened with)
+        self.broadcasts = BroadcastHub() if BROADCAST_ENABLED else None  # Live streams shared between guilds
+        self.loudness = LoudnessCache(worker_path(LOUDNESS_CACHE_PATH, cluster_worker)) if LOUDNESS_ENABLED else None  # Per-track loudness gains
+        self.resolving = {}  # id(placeholder Track) -> YouTube lookup task
+        self.audio_cache = AudioCache(worker_path(AUDIO_CACHE_DIR, cluster_worker)) if AUDIO_CACHE_ENABLED else None  # Downloaded audio files
+        self.audio_cache_verified = False
+        if self.audio_cache and self.loudness:
+            self.audio_cache.on_downloaded = self.measure_loudness
+        self.cluster_worker = cluster_worker  # Worker number when running as part of a cluster
+        heartbeat_name = 'heartbeat' if cluster_worker is None else f'heartbeat-{cluster_worker}'
+        self.snapshot_store = SnapshotStore(heartbeat_name=heartbeat_name) if SNAPSHOT_ENABLED else None  # Queues kept across restarts
+        self.snapshot_signatures = {}  # Guild ID -> state signature at the last save
+        self.snapshot_task = None
+        self.metrics_server = None
+        self.watchdog = LoopWatchdog() if WATCHDOG_ENABLED else None  # Event loop stall detection
+        self.profiling = False
+        self.reaper = VoiceReaper(self)  # Leaves empty or unused voice channels
+        self.warm_up_task = None
         
     async def on_ready(self):
         print(f'🎵 {BOT_NAME} v{BOT_VERSION} is online!')
@@ -35,6 +84,161 @@ class MusicBot(commands.Bot):
         # Set bot status
         activity = discord.Activity(type=discord.ActivityType.listening, name="music | !help")
         await self.change_presence(activity=activity)
+        
+        # Check cached audio files once per process, off the event loop
+        if self.audio_cache and not self.audio_cache_verified:
+            self.audio_cache_verified = True
+            await self.loop.run_in_executor(None, self.audio_cache.verify)
+        
+        if self.watchdog and self.watchdog.thread is None:
+            self.watchdog.start()
+        self.reaper.start()
+        if self.warm_up_task is None:
+            self.warm_up_task = self.loop.create_task(self.warm_up())
+        if METRICS_ENABLED and self.metrics_server is None:
+            await self.start_metrics()
+        
+        # Bring back queues from before the last restart, then keep saving them
+        if self.snapshot_store and self.snapshot_task is None:
+            self.snapshot_task = self.loop.create_task(self.snapshot_loop())
+            await self.restore_snapshots()
+
+    async def close(self):
+        await self.shutdown()
+        await super().close()
+
+    async def shutdown(self):
+        """Stop the bot's own subsystems; close() also disconnects from Discord"""
+        if self.snapshot_store:
+            # Save before the players are stopped, which clears their queues
+            if self.snapshot_task:
+                self.snapshot_task.cancel()
+            self.write_snapshots(*self.collect_snapshots())
+        for player in self.players.values():
+            player.close()
+        self.reaper.stop()
+        if self.warm_up_task:
+            self.warm_up_task.cancel()
+        if self.watchdog:
+            self.watchdog.stop()
+        if self.metrics_server:
+            await self.metrics_server.close()
+        self.resolver.close()
+        if self.broadcasts:
+            self.broadcasts.close()
+        if self.track_index:
+            self.track_index.close()
+        if self.loudness:
+            self.loudness.close()
+        if self.audio_cache:
+            self.audio_cache.close()
+        await self.spotify_handler.close()
+
+    async def warm_up(self):
+        """Load the slow subsystems in the background once connected, not before"""
+        await asyncio.sleep(WARM_UP_DELAY)
+        steps = [('yt-dlp', self.resolver.warm_up), ('Spotify', self.spotify_handler.warm_up)]
+        if self.track_index:
+            steps.append(('Track index', self.track_index.load))
+        if self.loudness:
+            steps.append(('Loudness', self.loudness.load))
+        for name, warm_up in steps:
+            started = time.perf_counter()
+            try:
+                await warm_up()
+            except Exception as e:
+                print(f"Error warming up {name}: {e}")
+                continue
+            print(f"🔥 {name} ready in {time.perf_counter() - started:.2f}s")
+
+    async def on_voice_state_update(self, member, before, after):
+        if member.id == self.user.id and after.channel is None:
+            # Kicked or disconnected; nothing left to play to
+            self.release_guild(member.guild.id)
+            self.reaper.forget(member.guild.id)
+        elif before.channel != after.channel:
+            self.reaper.voice_state_changed(member.guild)
+
+    async def invoke(self, ctx):
+        ctx.invoked_at = time.perf_counter()
+        if ctx.command:
+            # Lets the watchdog say which command was running during a stall
+            asyncio.current_task().set_name(f'command:{ctx.command.qualified_name}')
+        try:
+            await super().invoke(ctx)
+        finally:
+            if ctx.command:
+                COMMAND_LATENCY.observe(time.perf_counter() - ctx.invoked_at, ctx.command.qualified_name)
+
+    async def start_metrics(self):
+        """Register the bot's gauges and serve /metrics"""
+        def players_by_state():
+            counts = {(state.value,): 0 for state in PlayerState}
+            for player in self.players.values():
+                counts[(player.state.value,)] += 1
+            return counts
+        
+        def cache_hit_ratios():
+            caches = {'stream': self.stream_cache, 'spotify': self.spotify_handler.cache}
+            if self.resolver.cache:
+                caches['search'] = self.resolver.cache
+            if self.audio_cache:
+                caches['audio'] = self.audio_cache
+            if self.track_index:
+                caches['track_index'] = self.track_index
+            return {(name,): cache.hits / (cache.hits + cache.misses) if cache.hits + cache.misses else 0.0
+                    for name, cache in caches.items()}
+        
+        def cache_entries():
+            caches = {'search': self.resolver.cache, 'audio': self.audio_cache, 'track_index': self.track_index}
+            return {(name,): cache.stats()['entries'] for name, cache in caches.items() if cache}
+        
+        Gauge('musicbot_voice_clients', 'Connected voice clients', lambda: len(self.voice_clients))
+        Gauge('musicbot_players', 'Guild players by state', players_by_state, ['state'])
+        Gauge('musicbot_queued_tracks', 'Songs waiting in all queues',
+              lambda: sum(len(queue) for queue in self.queues.values()))
+        Gauge('musicbot_max_queue_depth', 'Length of the longest queue',
+              lambda: max((len(queue) for queue in self.queues.values()), default=0))
+        Gauge('musicbot_queue_memory_bytes', 'Approximate memory held by all queues and their songs',
+              lambda: sum(queue.memory_usage() for queue in list(self.queues.values())))
+        Gauge('musicbot_ffmpeg_processes', 'Running FFmpeg processes (playing, pre-spawned and measuring loudness)',
+              self.count_ffmpeg_processes)
+        if self.broadcasts:
+            Gauge('musicbot_broadcasts', 'Live streams shared between guilds', lambda: len(self.broadcasts.sources()))
+            Gauge('musicbot_broadcast_listeners', 'Guilds listening to a shared live stream',
+                  self.broadcasts.listener_count)
+        Gauge('musicbot_resolver_pending', 'yt-dlp extractions running or handed to the pool', lambda: len(self.resolver.pending))
+        Gauge('musicbot_resolver_waiting', 'yt-dlp extractions waiting for a fair share of the pool',
+              self.resolver.scheduler.waiting, ['class'])
+        Gauge('musicbot_cache_hit_ratio', 'Hit ratio of each cache since startup', cache_hit_ratios, ['cache'])
+        Gauge('musicbot_cache_entries', 'Entries stored in each persistent cache', cache_entries, ['cache'])
+        if self.audio_cache:
+            Gauge('musicbot_audio_cache_bytes', 'Size of the downloaded audio files',
+                  lambda: self.audio_cache.stats()['bytes'])
+        
+        port = METRICS_PORT + (self.cluster_worker or 0)
+        self.metrics_server = MetricsServer(port=port)
+        try:
+            await self.metrics_server.start()
+        except OSError as e:
+            print(f"Error starting metrics server on port {port}: {e}")
+
+    def count_ffmpeg_processes(self):
+        sources = [getattr(voice_client, 'source', None) for voice_client in self.voice_clients]
+        sources.extend(prepared[1] for prepared in self.prepared_sources.values())
+        if self.broadcasts:
+            # Guilds listening to a broadcast share its one process
+            sources.extend(self.broadcasts.sources())
+        count = 0
+        for source in sources:
+            # Volume transformers wrap the FFmpeg source
+            source = getattr(source, 'original', source)
+            process = getattr(source, '_process', None)
+            if process is not None and process.poll() is None:
+                count += 1
+        if self.loudness:
+            count += self.loudness.running
+        return count
 
     def get_ytdl_options(self):
         return {
@@ -52,11 +256,19 @@ class MusicBot(commands.Bot):
             'extract_flat': False,
         }
 
-    def get_ffmpeg_options(self):
-        return {
-            'before_options': '-reconnect 1 -reconnect_streamed 1 -reconnect_delay_max 5',
-            'options': '-vn'
-        }
+    def get_ffmpeg_options(self, local=False, start=0):
+        before_options = []
+        if start:
+            # Seeking on the input skips the start without decoding it
+            before_options.append(f'-ss {start:.1f}')
+        if not local:
+            # Reconnect options only apply to network inputs
+            before_options.append('-reconnect 1 -reconnect_streamed 1 -reconnect_delay_max 5')
+        
+        options = {'options': '-vn'}
+        if before_options:
+            options['before_options'] = ' '.join(before_options)
+        return options
 
     async def join_voice_channel(self, ctx):
         """Join the user's voice channel"""
@@ -67,6 +279,9 @@ class MusicBot(commands.Bot):
         channel = ctx.author.voice.channel
         
         if ctx.voice_client is None:
+            if MAX_VOICE_SESSIONS and len(self.voice_clients) >= MAX_VOICE_SESSIONS and not await self.reaper.shed():
+                await ctx.send(ERROR_MESSAGES['too_many_sessions'])
+                return False
             try:
                 await channel.connect()
             except discord.Forbidden:
@@ -78,41 +293,343 @@ class MusicBot(commands.Bot):
             
         return True
 
-    async def play_next_song(self, ctx):
-        """Play the next song in the queue"""
-        guild_id = ctx.guild.id
+    def get_player(self, ctx):
+        """Get the guild's player, pointing its messages at the invoking channel"""
+        player = self.players.get(ctx.guild.id)
+        if player is None:
+            player = GuildPlayer(self, ctx.guild.id, ctx.channel.id)
+            self.players[ctx.guild.id] = player
+        else:
+            player.text_channel_id = ctx.channel.id
+        return player
+
+    def start_playback(self, ctx):
+        """Tell the guild's player to start the queue; the command's start time is kept for metrics"""
+        self.get_player(ctx).post('play', 0, getattr(ctx, 'invoked_at', None))
+
+    def release_guild(self, guild_id):
+        """Stop the guild's player and drop its queue and other per-guild state"""
+        player = self.players.pop(guild_id, None)
+        if player:
+            player.close()
+        self.reset_prefetch(guild_id)
+        self.queues.pop(guild_id, None)
+        self.current_song.pop(guild_id, None)
+
+    def ffmpeg_slots_left(self):
+        """FFmpeg processes that can still be started, shedding pre-spawned ones at the cap"""
+        if not MAX_FFMPEG_PROCESSES:
+            return 1
+        left = MAX_FFMPEG_PROCESSES - self.count_ffmpeg_processes()
+        # Pre-spawned processes are only a head start; playing songs need them more
+        for guild_id in list(self.prepared_sources):
+            if left > 0:
+                break
+            self.discard_prepared_source(guild_id)
+            left += 1
+        return left
+
+    def is_idle(self, guild_id):
+        player = self.players.get(guild_id)
+        return player is None or player.state is PlayerState.IDLE
+
+    def playback_scale(self, guild_id, track):
+        """The guild's volume and the track's loudness gain, and whether applying them needs PCM"""
+        player = self.players.get(guild_id)
+        volume = player.volume if player else DEFAULT_VOLUME
+        gain = self.loudness.gain(track.url) if self.loudness else 1.0
+        # FFmpeg applies the gain on the Opus path, only the volume needs discord.py to scale PCM
+        return volume, gain, not OPUS_PASSTHROUGH or abs(volume - 1) > 0.01
+
+    def apply_gain(self, source, volume, gain):
+        """Scale a PCM source by volume and gain in one step; Opus sources already have the gain"""
+        if source.is_opus():
+            return source
+        return GainTransformer(source, volume, gain)
+
+    async def open_source(self, guild_id, track, start=0):
+        """Open the audio source for a resolved track, using the pre-spawned one if it matches"""
+        volume, gain, pcm = self.playback_scale(guild_id, track)
+        prepared = self.prepared_sources.pop(guild_id, None)
+        if prepared and prepared[0] is track and not start and prepared[2] == (pcm, gain):
+            return self.apply_gain(prepared[1], volume, gain)
+        if prepared:
+            prepared[1].cleanup()
+        key = video_key(track.url)
+        joining = self.broadcasts is not None and key in self.broadcasts
+        if not joining and self.ffmpeg_slots_left() <= 0:
+            raise CapacityReached(f"FFmpeg process limit ({MAX_FFMPEG_PROCESSES}) reached")
+        stream = await self.get_stream(track, guild_id)
+        if self.broadcasts is not None and stream.get('live'):
+            # Live streams can't be seeked, every guild hears the same moment
+            source = await self.broadcasts.listen(key, lambda: self.create_audio_source(stream))
+        else:
+            source = await self.create_audio_source(stream, start, pcm, gain)
+        return self.apply_gain(source, volume, gain)
+
+    def snapshot_state(self, guild_id):
+        """Return (signature, snapshot) for a guild, or (None, None) when there is nothing to keep"""
+        queue = self.queues.get(guild_id)
+        current = self.current_song.get(guild_id)
+        guild = self.get_guild(guild_id)
+        voice_client = guild.voice_client if guild else None
+        if not queue and not current:
+            return None, None
         
-        if guild_id not in self.queues or not self.queues[guild_id]:
+        player = self.players.get(guild_id)
+        started_at = player.started_at if player else None
+        paused = bool(player and player.paused_at)
+        voice_channel_id = voice_client.channel.id if voice_client else None
+        text_channel_id = player.text_channel_id if player else None
+        signature = (queue.version if queue else None, id(current), started_at, paused,
+                     voice_channel_id, text_channel_id)
+        if signature == self.snapshot_signatures.get(guild_id):
+            return signature, None
+        
+        return signature, {
+            'guild_id': guild_id,
+            'voice_channel_id': voice_channel_id,
+            'text_channel_id': text_channel_id,
+            'current': current.to_state() if current else None,
+            'started_at': None if paused else started_at,
+            'paused_position': player.position() if paused else None,
+            'queue': [track.to_state() for track in queue or ()]
+        }
+
+    def collect_snapshots(self):
+        """Snapshots of the guilds that changed since the last save, and guilds to forget"""
+        writes = {}
+        deletes = []
+        for guild_id in set(self.queues) | set(self.current_song) | set(self.snapshot_signatures):
+            signature, snapshot = self.snapshot_state(guild_id)
+            if signature is None:
+                if self.snapshot_signatures.pop(guild_id, None) is not None:
+                    deletes.append(guild_id)
+            elif snapshot is not None:
+                writes[guild_id] = snapshot
+                self.snapshot_signatures[guild_id] = signature
+        return writes, deletes
+
+    def write_snapshots(self, writes, deletes):
+        """Blocking; saves changed guilds and refreshes the heartbeat"""
+        for guild_id, snapshot in writes.items():
+            try:
+                self.snapshot_store.save(guild_id, snapshot)
+            except OSError as e:
+                print(f"Error saving snapshot for guild {guild_id}: {e}")
+                self.snapshot_signatures.pop(guild_id, None)
+        for guild_id in deletes:
+            self.snapshot_store.delete(guild_id)
+        self.snapshot_store.heartbeat()
+
+    async def snapshot_loop(self):
+        while True:
+            await asyncio.sleep(SNAPSHOT_INTERVAL)
+            try:
+                await self.loop.run_in_executor(None, self.write_snapshots, *self.collect_snapshots())
+            except Exception as e:
+                print(f"Error saving snapshots: {e}")
+
+    async def restore_snapshots(self):
+        """Restore saved queues and resume playback a few guilds at a time"""
+        snapshots = await self.loop.run_in_executor(None, self.snapshot_store.load_all)
+        if not snapshots:
             return
+        last_alive = self.snapshot_store.last_heartbeat() or time.time()
+        semaphore = asyncio.Semaphore(SNAPSHOT_RESTORE_CONCURRENCY)
+        await asyncio.gather(*(
+            self.restore_guild(snapshot, last_alive, semaphore) for snapshot in snapshots.values()
+        ))
+
+    async def restore_guild(self, snapshot, last_alive, semaphore):
+        """Restore one guild's queue; rejoin voice only if someone is still listening.
+
+        Tracks keep their resolved YouTube URLs, so nothing is looked up
+        again until it is about to play.
+        """
+        guild = self.get_guild(snapshot['guild_id'])
+        if guild is None or self.queues.get(guild.id) or guild.id in self.current_song:
+            return
+        
+        queue = GuildQueue(Track.from_state(state) for state in snapshot['queue'])
+        position = 0
+        if snapshot['current']:
+            current = Track.from_state(snapshot['current'])
+            if snapshot['paused_position'] is not None:
+                position = snapshot['paused_position']
+            elif snapshot['started_at'] is not None:
+                # Resume from the last moment the bot was known to be running
+                position = max(last_alive - snapshot['started_at'], 0)
+            if current.duration and position >= current.duration - 5:
+                position = 0
+            else:
+                queue.appendleft(current)
+        self.queues[guild.id] = queue
+        
+        channel = guild.get_channel(snapshot['voice_channel_id']) if snapshot['voice_channel_id'] else None
+        if not queue or channel is None or not any(not member.bot for member in channel.members):
+            return
+        
+        async with semaphore:
+            try:
+                if guild.voice_client is None:
+                    await channel.connect()
+            except (discord.ClientException, discord.HTTPException, asyncio.TimeoutError) as e:
+                print(f"Error rejoining voice channel in guild {guild.id}: {e}")
+                return
             
-        song_info = self.queues[guild_id].pop(0)
-        self.current_song[guild_id] = song_info
+            player = self.players.get(guild.id)
+            if player is None:
+                player = GuildPlayer(self, guild.id, snapshot['text_channel_id'])
+                self.players[guild.id] = player
+            try:
+                await player.request('play', position)
+            except PlayerClosed:
+                # Left the channel again before the queue could start
+                return
+            # Finish loading before the next guild starts, so a restart doesn't flood the resolver
+            if player.load_task:
+                await asyncio.wait([player.load_task])
+
+    async def get_stream(self, track, guild_id=None, bulk=False):
+        """Get the direct stream (URL and codec) for a track, reusing a cached one while it is valid"""
+        if self.audio_cache:
+            stream = self.audio_cache.get(track.url)
+            if stream:
+                return stream
         
+        stream = self.stream_cache.get(track.url)
+        if stream is None:
+            info = await self.resolver.extract(track.url, guild_id=guild_id, bulk=bulk)
+            audio_format = select_audio_format(info)
+            stream = {
+                'url': audio_format['url'],
+                'format_id': audio_format.get('format_id'),
+                'acodec': audio_format.get('acodec'),
+                'ext': audio_format.get('ext'),
+                'live': bool(info.get('is_live'))
+            }
+            self.stream_cache.put(track.url, stream)
+        return stream
+
+    async def create_audio_source(self, stream, start=0, pcm=False, gain=1.0):
+        """Create the FFmpeg source for a stream.
+
+        Opus streams in WebM/Ogg are remuxed without re-encoding, other
+        codecs, or streams with a loudness gain, are transcoded to Opus
+        inside FFmpeg, so discord.py never has to encode PCM itself. The
+        classic PCM pipeline, where the caller applies the gain, is used
+        when the volume has to be scaled (pcm) or OPUS_PASSTHROUGH is
+        disabled.
+        """
+        options = self.get_ffmpeg_options(local=stream.get('local', False), start=start)
+        if pcm or not OPUS_PASSTHROUGH:
+            return discord.FFmpegPCMAudio(stream['url'], **options)
+        
+        if gain != 1.0:
+            options['options'] += f' -af volume={gain:.4f}'
+        elif stream.get('acodec') == 'opus' and stream.get('ext') in ('webm', 'ogg', 'opus'):
+            return discord.FFmpegOpusAudio(stream['url'], codec='copy', **options)
+        elif stream.get('acodec') in (None, 'unknown'):
+            # Let ffprobe decide whether the stream can be copied
+            return await discord.FFmpegOpusAudio.from_probe(stream['url'], method='fallback', **options)
+        return discord.FFmpegOpusAudio(stream['url'], bitrate=get_profile()['target_kbps'], **options)
+
+    def queue_space(self, guild_id):
+        """Number of songs that still fit in the guild's queue"""
+        return max(MAX_QUEUE_SIZE - len(self.queues.get(guild_id, [])), 0)
+
+    def enqueue(self, ctx, track):
+        """Add a track to the guild's queue, pre-resolving it if it plays next"""
+        guild_id = ctx.guild.id
+        self.queues[guild_id].append(track)
+        if len(self.queues[guild_id]) == 1 and not self.is_idle(guild_id):
+            self.schedule_prefetch(guild_id)
+
+    def schedule_prefetch(self, guild_id):
+        """Start pre-resolving the next queued song while the current one plays"""
+        task = self.prefetch_tasks.pop(guild_id, None)
+        if task:
+            task.cancel()
+        if self.queues.get(guild_id):
+            self.prefetch_tasks[guild_id] = self.loop.create_task(self.prefetch_next(guild_id))
+
+    async def prefetch_next(self, guild_id):
+        """Resolve the stream URL (and optionally spawn FFmpeg) for the next song"""
         try:
-            with yt_dlp.YoutubeDL(self.get_ytdl_options()) as ydl:
-                info = ydl.extract_info(song_info['url'], download=False)
-                url = info['formats'][0]['url']
-                
-            source = discord.FFmpegPCMAudio(url, **self.get_ffmpeg_options())
-            ctx.voice_client.play(source, after=lambda e: asyncio.run_coroutine_threadsafe(
-                self.play_next_song(ctx), self.loop
-            ))
+            await self.resolve_ahead(guild_id)
+            if self.audio_cache:
+                await self.download_ahead(guild_id)
             
-            embed = discord.Embed(
-                title="🎵 Now Playing",
-                description=f"**{song_info['title']}**\nDuration: {song_info['duration']}",
-                color=0x00ff00
-            )
-            embed.set_thumbnail(url=song_info['thumbnail'])
-            embed.add_field(name="Requested by", value=song_info['requester'], inline=True)
-            embed.add_field(name="Queue", value=f"{len(self.queues[guild_id])} songs", inline=True)
+            track = self.next_track(guild_id)
+            if not track or not track.resolved:
+                return
             
-            await ctx.send(embed=embed)
+            stream = await self.get_stream(track, guild_id, bulk=True)
+            self.measure_loudness(track.url, stream)
+            prepared = self.prepared_sources.get(guild_id)
+            if not PRESPAWN_FFMPEG or stream.get('live') or (prepared and prepared[0] is track):
+                # A live stream started early would only fall behind
+                return
+            # Don't take a process a song that is starting now might need
+            if MAX_FFMPEG_PROCESSES and self.count_ffmpeg_processes() >= MAX_FFMPEG_PROCESSES - 1:
+                return
             
+            # Only keep the process if the track is still next in line
+            if self.next_track(guild_id) is track:
+                self.discard_prepared_source(guild_id)
+                _, gain, pcm = self.playback_scale(guild_id, track)
+                source = await self.create_audio_source(stream, pcm=pcm, gain=gain)
+                # The queue may have changed while ffprobe was running
+                if self.next_track(guild_id) is track and guild_id not in self.prepared_sources:
+                    self.prepared_sources[guild_id] = (track, source, (pcm, gain))
+                else:
+                    source.cleanup()
+        except asyncio.CancelledError:
+            raise
         except Exception as e:
-            print(f"Error playing song: {e}")
-            await ctx.send("❌ Error playing the song. Skipping to next...")
-            await self.play_next_song(ctx)
+            print(f"Error pre-resolving next song: {e}")
+
+    def measure_loudness(self, webpage_url, stream):
+        """Start measuring a track's loudness in the background unless it is known already"""
+        if self.loudness is None or stream.get('live') or self.loudness.contains(webpage_url):
+            return
+        if self.audio_cache and not stream.get('local'):
+            # Measured from the audio cache's copy once downloaded, rather than fetched twice
+            return
+        # Don't take a process a song that is starting now might need
+        if MAX_FFMPEG_PROCESSES and self.count_ffmpeg_processes() >= MAX_FFMPEG_PROCESSES - 1:
+            return
+        options = self.get_ffmpeg_options(local=stream.get('local', False))
+        self.loudness.schedule(webpage_url, stream, options.get('before_options', ''))
+
+    async def download_ahead(self, guild_id):
+        """Start downloading the next few queued songs into the audio cache"""
+        queue = self.queues.get(guild_id)
+        for track in queue.head(AUDIO_CACHE_DOWNLOAD_AHEAD) if queue else []:
+            if not track.resolved or self.audio_cache.contains(track.url):
+                continue
+            stream = await self.get_stream(track, guild_id, bulk=True)
+            if not stream.get('local') and not stream.get('live'):
+                self.audio_cache.schedule_download(self.resolver, track.url, stream)
+
+    def next_track(self, guild_id):
+        """The track that plays next in a guild, or None"""
+        queue = self.queues.get(guild_id)
+        return queue.peek() if queue else None
+
+    def discard_prepared_source(self, guild_id):
+        """Kill a pre-spawned FFmpeg process that will not be used"""
+        prepared = self.prepared_sources.pop(guild_id, None)
+        if prepared:
+            prepared[1].cleanup()
+
+    def reset_prefetch(self, guild_id):
+        """Cancel pre-resolution work for a guild after its queue changed"""
+        task = self.prefetch_tasks.pop(guild_id, None)
+        if task:
+            task.cancel()
+        self.discard_prepared_source(guild_id)
 
     @commands.command(name='join', aliases=['j'])
     async def join(self, ctx):
@@ -128,11 +645,8 @@ class MusicBot(commands.Bot):
             await ctx.send("👋 Left the voice channel")
             
             # Clear queue and current song
-            guild_id = ctx.guild.id
-            if guild_id in self.queues:
-                del self.queues[guild_id]
-            if guild_id in self.current_song:
-                del self.current_song[guild_id]
+            self.release_guild(ctx.guild.id)
+            self.reaper.forget(ctx.guild.id)
         else:
             await ctx.send(ERROR_MESSAGES['bot_not_in_voice'])
 
@@ -151,73 +665,41 @@ class MusicBot(commands.Bot):
             await search_msg.edit(content=ERROR_MESSAGES['spotify_invalid_link'])
             return
         
-        guild_id = ctx.guild.id
-        
         try:
             if url_type == 'track':
                 # Single track
-                track_info = self.spotify_handler.get_track_info(spotify_id)
+                track_info = await self.spotify_handler.get_track_info(spotify_id)
                 if not track_info:
                     await search_msg.edit(content=ERROR_MESSAGES['no_results'])
                     return
                 
                 search_query = self.spotify_handler.create_search_query(track_info)
-                await search_msg.edit(content=f"🎵 Found on Spotify: **{track_info['title']}** by {track_info['artist']}\n🔍 Searching on YouTube...")
+                search_msg.update(content=f"🎵 Found on Spotify: **{track_info['title']}** by {track_info['artist']}\n🔍 Searching on YouTube...")
                 
                 # Search on YouTube
                 await self.search_and_play_youtube(ctx, search_query, search_msg, track_info)
                 
             elif url_type == 'album':
                 # Album
-                album_info = self.spotify_handler.get_album_tracks(spotify_id, limit=20)
+                search_msg.update(content="📥 Loading Spotify album...")
+                album_info = await self.spotify_handler.get_album_tracks(spotify_id, max_tracks=self.queue_space(ctx.guild.id))
                 if not album_info or not album_info['tracks']:
                     await search_msg.edit(content=ERROR_MESSAGES['no_results'])
                     return
                 
-                if len(album_info['tracks']) > 20:
-                    await search_msg.edit(content=ERROR_MESSAGES['spotify_album_too_large'])
-                    return
-                
-                await search_msg.edit(content=f"🎵 Found album: **{album_info['name']}** by {album_info['artist']}\n🔍 Adding {len(album_info['tracks'])} songs to queue...")
-                
-                # Add all tracks to queue
-                added_count = 0
-                for track in album_info['tracks']:
-                    if len(self.queues[guild_id]) >= MAX_QUEUE_SIZE:
-                        break
-                    
-                    search_query = f"{track['title']} {track['artist']}"
-                    success = await self.search_and_add_to_queue(ctx, search_query, track)
-                    if success:
-                        added_count += 1
-                
-                await search_msg.edit(content=f"✅ Added {added_count} songs from album **{album_info['name']}** to queue!")
+                added_count, skipped = await self.import_spotify_tracks(ctx, album_info['tracks'])
+                await search_msg.edit(content=f"✅ Added {added_count} songs from album **{album_info['name']}** to queue!" + self.format_import_failures(skipped))
                 
             elif url_type == 'playlist':
                 # Playlist
-                playlist_info = self.spotify_handler.get_playlist_tracks(spotify_id, limit=20)
+                search_msg.update(content="📥 Loading Spotify playlist...")
+                playlist_info = await self.spotify_handler.get_playlist_tracks(spotify_id, max_tracks=self.queue_space(ctx.guild.id))
                 if not playlist_info or not playlist_info['tracks']:
                     await search_msg.edit(content=ERROR_MESSAGES['no_results'])
                     return
                 
-                if len(playlist_info['tracks']) > 20:
-                    await search_msg.edit(content=ERROR_MESSAGES['spotify_playlist_too_large'])
-                    return
-                
-                await search_msg.edit(content=f"🎵 Found playlist: **{playlist_info['name']}** by {playlist_info['owner']}\n🔍 Adding {len(playlist_info['tracks'])} songs to queue...")
-                
-                # Add all tracks to queue
-                added_count = 0
-                for track in playlist_info['tracks']:
-                    if len(self.queues[guild_id]) >= MAX_QUEUE_SIZE:
-                        break
-                    
-                    search_query = f"{track['title']} {track['artist']}"
-                    success = await self.search_and_add_to_queue(ctx, search_query, track)
-                    if success:
-                        added_count += 1
-                
-                await search_msg.edit(content=f"✅ Added {added_count} songs from playlist **{playlist_info['name']}** to queue!")
+                added_count, skipped = await self.import_spotify_tracks(ctx, playlist_info['tracks'])
+                await search_msg.edit(content=f"✅ Added {added_count} songs from playlist **{playlist_info['name']}** to queue!" + self.format_import_failures(skipped))
                 
         except Exception as e:
             print(f"Error handling Spotify URL: {e}")
@@ -226,96 +708,133 @@ class MusicBot(commands.Bot):
     async def search_and_play_youtube(self, ctx, search_query, search_msg, spotify_info=None):
         """Search and play from YouTube"""
         try:
-            with yt_dlp.YoutubeDL(self.get_ytdl_options()) as ydl:
-                info = ydl.extract_info(f"ytsearch:{search_query}", download=False)
-                if not info['entries']:
-                    await search_msg.edit(content=ERROR_MESSAGES['no_results'])
-                    return
-                info = info['entries'][0]
-                
-                # Check song length
-                duration = info.get('duration', 0)
-                if duration > MAX_SONG_LENGTH:
-                    await search_msg.edit(content=ERROR_MESSAGES['song_too_long'])
-                    return
+            info = await self.find_track(search_query, ctx.guild.id)
+            if not info:
+                await search_msg.edit(content=ERROR_MESSAGES['no_results'])
+                return
+            
+            # Check song length
+            if (info.get('duration') or 0) > MAX_SONG_LENGTH:
+                await search_msg.edit(content=ERROR_MESSAGES['song_too_long'])
+                return
+            
+            track = Track.from_info(info, ctx.author.mention, search_query, spotify_info)
+            guild_id = ctx.guild.id
+            self.enqueue(ctx, track)
+            if self.track_index:
+                self.track_index.record(info, search_query, spotify_info)
+            
+            # If nothing is playing, start playing
+            if self.is_idle(guild_id):
+                await search_msg.edit(content="✅ Song added to queue!")
+                self.start_playback(ctx)
+            else:
+                embed = discord.Embed(
+                    title="✅ Added to Queue",
+                    description=f"**{track.title}**\nDuration: {track.duration_str}",
+                    color=0x00ff00
+                )
+                if track.thumbnail:
+                    embed.set_thumbnail(url=track.thumbnail)
                 
-                # Format duration
-                minutes, seconds = divmod(duration, 60)
-                duration_str = f"{minutes}:{seconds:02d}" if duration else "Unknown"
+                embed.add_field(name="Position in queue", value=len(self.queues[guild_id]), inline=True)
+                embed.add_field(name="Requested by", value=track.requester, inline=True)
                 
-                song_info = {
-                    'title': info.get('title', 'Unknown Title'),
-                    'url': info.get('webpage_url', search_query),
-                    'duration': duration_str,
-                    'thumbnail': info.get('thumbnail', ''),
-                    'requester': ctx.author.mention,
-                    'spotify_info': spotify_info
-                }
+                if track.spotify_title:
+                    embed.add_field(name="From Spotify", value=f"🎵 {track.spotify_title} by {track.spotify_artist}", inline=False)
                 
-                guild_id = ctx.guild.id
-                self.queues[guild_id].append(song_info)
+                await search_msg.edit(content="", embed=embed)
                 
-                # If nothing is playing, start playing
-                if not ctx.voice_client.is_playing():
-                    await search_msg.edit(content="✅ Song added to queue!")
-                    await self.play_next_song(ctx)
-                else:
-                    embed = discord.Embed(
-                        title="✅ Added to Queue",
-                        description=f"**{song_info['title']}**\nDuration: {song_info['duration']}",
-                        color=0x00ff00
-                    )
-                    if spotify_info and spotify_info.get('album_art'):
-                        embed.set_thumbnail(url=spotify_info['album_art'])
-                    elif song_info['thumbnail']:
-                        embed.set_thumbnail(url=song_info['thumbnail'])
-                    
-                    embed.add_field(name="Position in queue", value=len(self.queues[guild_id]), inline=True)
-                    embed.add_field(name="Requested by", value=song_info['requester'], inline=True)
-                    
-                    if spotify_info:
-                        embed.add_field(name="From Spotify", value=f"🎵 {spotify_info['title']} by {spotify_info['artist']}", inline=False)
-                    
-                    await search_msg.edit(content="", embed=embed)
-                    
+        except ResolverTimeout as e:
+            print(f"Error searching YouTube: {e}")
+            await search_msg.edit(content=ERROR_MESSAGES['resolver_timeout'])
         except Exception as e:
             print(f"Error searching YouTube: {e}")
             await search_msg.edit(content=ERROR_MESSAGES['invalid_url'])
     
-    async def search_and_add_to_queue(self, ctx, search_query, spotify_info=None):
-        """Search and add to queue without playing"""
+    async def find_track(self, query, guild_id=None, bulk=False):
+        """First YouTube result for a query, answered from the track index when it is sure"""
+        if self.track_index:
+            info = self.track_index.match(query)
+            if info:
+                return info
+        return await self.resolver.search(query, guild_id=guild_id, bulk=bulk)
+
+    async def ensure_resolved(self, track, guild_id=None, bulk=False):
+        """Resolve a placeholder track to YouTube in place; returns success"""
+        if track.resolved:
+            return True
+        
+        key = id(track)
+        task = self.resolving.get(key)
+        if task is None:
+            task = self.loop.create_task(self._resolve_placeholder(track, guild_id, bulk))
+            self.resolving[key] = task
+            task.add_done_callback(lambda _: self.resolving.pop(key, None))
+        elif not bulk:
+            # Started as look-ahead, but now the song is about to play
+            self.resolver.promote_search(track.query)
+        # Shield so a cancelled prefetch doesn't abort a lookup others are waiting on
+        return await asyncio.shield(task)
+
+    async def _resolve_placeholder(self, track, guild_id, bulk):
         try:
-            with yt_dlp.YoutubeDL(self.get_ytdl_options()) as ydl:
-                info = ydl.extract_info(f"ytsearch:{search_query}", download=False)
-                if not info['entries']:
-                    return False
-                info = info['entries'][0]
-                
-                # Check song length
-                duration = info.get('duration', 0)
-                if duration > MAX_SONG_LENGTH:
-                    return False
-                
-                # Format duration
-                minutes, seconds = divmod(duration, 60)
-                duration_str = f"{minutes}:{seconds:02d}" if duration else "Unknown"
-                
-                song_info = {
-                    'title': info.get('title', 'Unknown Title'),
-                    'url': info.get('webpage_url', search_query),
-                    'duration': duration_str,
-                    'thumbnail': info.get('thumbnail', ''),
-                    'requester': ctx.author.mention,
-                    'spotify_info': spotify_info
-                }
-                
-                guild_id = ctx.guild.id
-                self.queues[guild_id].append(song_info)
-                return True
-                
+            info = await self.find_track(track.query, guild_id, bulk)
         except Exception as e:
-            print(f"Error adding to queue: {e}")
+            print(f"Error resolving queued song: {e}")
             return False
+        
+        if not info or (info.get('duration') or 0) > MAX_SONG_LENGTH:
+            return False
+        
+        track.resolve(info)
+        if self.track_index:
+            spotify_info = {'title': track.spotify_title, 'artist': track.spotify_artist} if track.spotify_title else None
+            self.track_index.record(info, track.query, spotify_info)
+        return True
+
+    async def resolve_ahead(self, guild_id):
+        """Resolve the next few placeholders in the queue to YouTube"""
+        queue = self.queues.get(guild_id)
+        upcoming = [track for track in queue.head(RESOLVE_AHEAD) if not track.resolved] if queue else []
+        if upcoming:
+            await asyncio.gather(*(self.ensure_resolved(song, guild_id, bulk=True) for song in upcoming))
+
+    async def import_spotify_tracks(self, ctx, tracks):
+        """Queue Spotify tracks as placeholders and start playing if idle.
+
+        Only the tracks near the front of the queue are looked up on YouTube
+        right away; the rest are resolved as playback reaches them. Returns
+        the number of queued songs and the tracks that were skipped.
+        """
+        guild_id = ctx.guild.id
+        added_count = 0
+        skipped = []
+        
+        for spotify_track in tracks:
+            if len(self.queues[guild_id]) >= MAX_QUEUE_SIZE:
+                break
+            if spotify_track['duration_ms'] // 1000 > MAX_SONG_LENGTH:
+                skipped.append(spotify_track)
+                continue
+            self.enqueue(ctx, Track.from_spotify(spotify_track, ctx.author.mention))
+            added_count += 1
+        
+        if added_count and self.is_idle(guild_id):
+            self.start_playback(ctx)
+        elif added_count:
+            self.schedule_prefetch(guild_id)
+        
+        return added_count, skipped
+
+    def format_import_failures(self, skipped):
+        """Describe the tracks of an import that were skipped"""
+        if not skipped:
+            return ""
+        names = ", ".join(track['title'] for track in skipped[:5])
+        if len(skipped) > 5:
+            names += f" and {len(skipped) - 5} more"
+        return f"\n⚠️ {len(skipped)} songs were skipped for being longer than {MAX_SONG_LENGTH // 60} minutes: {names}"
 
     @commands.command(name='play', aliases=['p'])
     async def play(self, ctx, *, query):
@@ -325,14 +844,14 @@ class MusicBot(commands.Bot):
             
         guild_id = ctx.guild.id
         if guild_id not in self.queues:
-            self.queues[guild_id] = []
+            self.queues[guild_id] = GuildQueue()
             
         if len(self.queues[guild_id]) >= MAX_QUEUE_SIZE:
             await ctx.send(ERROR_MESSAGES['queue_full'])
             return
             
-        # Show searching message
-        search_msg = await ctx.send("🔍 Searching for your song...")
+        # Show searching message; later status changes are rate limited
+        search_msg = ProgressMessage(await ctx.send("🔍 Searching for your song..."))
         
         # Check if it's a Spotify URL
         if self.spotify_handler.is_spotify_url(query):
@@ -341,53 +860,44 @@ class MusicBot(commands.Bot):
         
         # Handle regular YouTube search or URL
         try:
-            with yt_dlp.YoutubeDL(self.get_ytdl_options()) as ydl:
-                # Check if it's a URL or search query
-                if query.startswith(('http://', 'https://')):
-                    info = ydl.extract_info(query, download=False)
-                else:
-                    info = ydl.extract_info(f"ytsearch:{query}", download=False)
-                    if not info['entries']:
-                        await search_msg.edit(content=ERROR_MESSAGES['no_results'])
-                        return
-                    info = info['entries'][0]
-                
-                # Check song length
-                duration = info.get('duration', 0)
-                if duration > MAX_SONG_LENGTH:
-                    await search_msg.edit(content=ERROR_MESSAGES['song_too_long'])
+            # Check if it's a URL or search query
+            if query.startswith(('http://', 'https://')):
+                info = await self.resolver.metadata(query, guild_id=guild_id)
+            else:
+                info = await self.find_track(query, guild_id)
+                if not info:
+                    await search_msg.edit(content=ERROR_MESSAGES['no_results'])
                     return
+            
+            # Check song length
+            if (info.get('duration') or 0) > MAX_SONG_LENGTH:
+                await search_msg.edit(content=ERROR_MESSAGES['song_too_long'])
+                return
+            
+            track = Track.from_info(info, ctx.author.mention, query)
+            self.enqueue(ctx, track)
+            if self.track_index:
+                self.track_index.record(info, query)
+            
+            # If nothing is playing, start playing
+            if self.is_idle(guild_id):
+                await search_msg.edit(content="✅ Song added to queue!")
+                self.start_playback(ctx)
+            else:
+                embed = discord.Embed(
+                    title="✅ Added to Queue",
+                    description=f"**{track.title}**\nDuration: {track.duration_str}",
+                    color=0x00ff00
+                )
+                embed.set_thumbnail(url=track.thumbnail)
+                embed.add_field(name="Position in queue", value=len(self.queues[guild_id]), inline=True)
+                embed.add_field(name="Requested by", value=track.requester, inline=True)
                 
-                # Format duration
-                minutes, seconds = divmod(duration, 60)
-                duration_str = f"{minutes}:{seconds:02d}" if duration else "Unknown"
-                
-                song_info = {
-                    'title': info.get('title', 'Unknown Title'),
-                    'url': info.get('webpage_url', query),
-                    'duration': duration_str,
-                    'thumbnail': info.get('thumbnail', ''),
-                    'requester': ctx.author.mention
-                }
-                
-                self.queues[guild_id].append(song_info)
+                await search_msg.edit(content="", embed=embed)
                 
-                # If nothing is playing, start playing
-                if not ctx.voice_client.is_playing():
-                    await search_msg.edit(content="✅ Song added to queue!")
-                    await self.play_next_song(ctx)
-                else:
-                    embed = discord.Embed(
-                        title="✅ Added to Queue",
-                        description=f"**{song_info['title']}**\nDuration: {song_info['duration']}",
-                        color=0x00ff00
-                    )
-                    embed.set_thumbnail(url=song_info['thumbnail'])
-                    embed.add_field(name="Position in queue", value=len(self.queues[guild_id]), inline=True)
-                    embed.add_field(name="Requested by", value=song_info['requester'], inline=True)
-                    
-                    await search_msg.edit(content="", embed=embed)
-                    
+        except ResolverTimeout as e:
+            print(f"Error in play command: {e}")
+            await search_msg.edit(content=ERROR_MESSAGES['resolver_timeout'])
         except Exception as e:
             print(f"Error in play command: {e}")
             await search_msg.edit(content=ERROR_MESSAGES['invalid_url'])
@@ -395,8 +905,7 @@ class MusicBot(commands.Bot):
     @commands.command(name='pause')
     async def pause(self, ctx):
         """Pause the current song"""
-        if ctx.voice_client and ctx.voice_client.is_playing():
-            ctx.voice_client.pause()
+        if ctx.voice_client and await self.get_player(ctx).request('pause'):
             await ctx.send("⏸️ Paused")
         else:
             await ctx.send(ERROR_MESSAGES['no_song_playing'])
@@ -404,8 +913,7 @@ class MusicBot(commands.Bot):
     @commands.command(name='resume')
     async def resume(self, ctx):
         """Resume the paused song"""
-        if ctx.voice_client and ctx.voice_client.is_paused():
-            ctx.voice_client.resume()
+        if ctx.voice_client and await self.get_player(ctx).request('resume'):
             await ctx.send("▶️ Resumed")
         else:
             await ctx.send("❌ Nothing is paused!")
@@ -413,8 +921,7 @@ class MusicBot(commands.Bot):
     @commands.command(name='skip', aliases=['s'])
     async def skip(self, ctx):
         """Skip the current song"""
-        if ctx.voice_client and ctx.voice_client.is_playing():
-            ctx.voice_client.stop()
+        if ctx.voice_client and await self.get_player(ctx).request('skip'):
             await ctx.send("⏭️ Skipped")
         else:
             await ctx.send(ERROR_MESSAGES['no_song_playing'])
@@ -423,12 +930,7 @@ class MusicBot(commands.Bot):
     async def stop(self, ctx):
         """Stop the music and clear the queue"""
         if ctx.voice_client:
-            ctx.voice_client.stop()
-            guild_id = ctx.guild.id
-            if guild_id in self.queues:
-                self.queues[guild_id] = []
-            if guild_id in self.current_song:
-                del self.current_song[guild_id]
+            await self.get_player(ctx).request('stop')
             await ctx.send("⏹️ Stopped and cleared queue")
         else:
             await ctx.send(ERROR_MESSAGES['no_song_playing'])
@@ -449,14 +951,14 @@ class MusicBot(commands.Bot):
             current = self.current_song[guild_id]
             embed.add_field(
                 name="🎵 Now Playing",
-                value=f"**{current['title']}**\nDuration: {current['duration']}",
+                value=f"**{current.title}**\nDuration: {current.duration_str}",
                 inline=False
             )
         
         # Show next 10 songs in queue
         queue_text = ""
-        for i, song in enumerate(self.queues[guild_id][:10], 1):
-            queue_text += f"{i}. **{song['title']}** ({song['duration']})\n"
+        for i, track in enumerate(self.queues[guild_id].head(10), 1):
+            queue_text += f"{i}. **{track.title}** ({track.duration_str})\n"
         
         if queue_text:
             embed.add_field(name="📋 Up Next", value=queue_text, inline=False)
@@ -470,22 +972,26 @@ class MusicBot(commands.Bot):
     async def volume(self, ctx, volume: int = None):
         """Set the volume (0-100)"""
         if volume is None:
-            if ctx.voice_client and ctx.voice_client.source:
-                current_volume = int(ctx.voice_client.source.volume * 100)
-                await ctx.send(f"🔊 Current volume: {current_volume}%")
-            else:
-                await ctx.send("❌ No audio source found")
+            player = self.players.get(ctx.guild.id)
+            current_volume = round((player.volume if player else DEFAULT_VOLUME) * 100)
+            await ctx.send(f"🔊 Current volume: {current_volume}%")
             return
             
         if not 0 <= volume <= 100:
             await ctx.send(ERROR_MESSAGES['invalid_volume'])
             return
             
-        if ctx.voice_client and ctx.voice_client.source:
-            ctx.voice_client.source.volume = volume / 100
+        if not ctx.voice_client:
+            await ctx.send(ERROR_MESSAGES['bot_not_in_voice'])
+        elif await self.get_player(ctx).request('volume', volume / 100):
             await ctx.send(f"🔊 Volume set to {volume}%")
+        elif isinstance(ctx.voice_client.source, BroadcastListener):
+            # One Opus stream for every server listening, it can't be scaled for this one
+            await ctx.send(f"🔊 Volume set to {volume}%. Shared live streams play at their own volume, "
+                           f"so it applies to other songs.")
         else:
-            await ctx.send(ERROR_MESSAGES['no_song_playing'])
+            # Nothing playing, or an Opus stream that can't be scaled
+            await ctx.send(f"🔊 Volume set to {volume}%, starting with the next song")
 
     @commands.command(name='nowplaying', aliases=['np'])
     async def nowplaying(self, ctx):
@@ -496,20 +1002,34 @@ class MusicBot(commands.Bot):
             await ctx.send(ERROR_MESSAGES['no_song_playing'])
             return
             
-        song = self.current_song[guild_id]
+        track = self.current_song[guild_id]
         embed = discord.Embed(
             title="🎵 Now Playing",
-            description=f"**{song['title']}**\nDuration: {song['duration']}",
+            description=f"**{track.title}**\nDuration: {track.duration_str}",
             color=0x00ff00
         )
-        embed.set_thumbnail(url=song['thumbnail'])
-        embed.add_field(name="Requested by", value=song['requester'], inline=True)
+        embed.set_thumbnail(url=track.thumbnail)
+        embed.add_field(name="Requested by", value=track.requester, inline=True)
         
         if guild_id in self.queues:
             embed.add_field(name="Queue", value=f"{len(self.queues[guild_id])} songs", inline=True)
         
         await ctx.send(embed=embed)
 
+    @commands.command(name='suggest', aliases=['find'])
+    async def suggest(self, ctx, *, query):
+        """Show songs played before that match a search, without searching YouTube"""
+        results = self.track_index.search(query) if self.track_index else []
+        if not results:
+            await ctx.send(ERROR_MESSAGES['no_results'])
+            return
+        
+        lines = [f"`{position}.` **{track.title}** ({format_duration(track.duration)}) - played {track.plays} times"
+                 for position, (track, _) in enumerate(results, 1)]
+        embed = discord.Embed(title=f"🔎 Songs matching \"{query}\"", description="\n".join(lines), color=0x00ff00)
+        embed.set_footer(text=f"Use {DISCORD_PREFIX}play with the song name to play one")
+        await ctx.send(embed=embed)
+
     @commands.command(name='shuffle')
     async def shuffle(self, ctx):
         """Shuffle the queue"""
@@ -519,21 +1039,98 @@ class MusicBot(commands.Bot):
             await ctx.send("❌ Need at least 2 songs in queue to shuffle!")
             return
             
-        import random
-        random.shuffle(self.queues[guild_id])
+        self.queues[guild_id].shuffle()
+        self.schedule_prefetch(guild_id)
         await ctx.send("🔀 Queue shuffled!")
 
+    @commands.command(name='remove', aliases=['rm'])
+    async def remove(self, ctx, position: int):
+        """Remove a song from the queue by its position"""
+        guild_id = ctx.guild.id
+        queue = self.queues.get(guild_id)
+        
+        if not queue:
+            await ctx.send(ERROR_MESSAGES['queue_empty'])
+            return
+        if not 1 <= position <= len(queue):
+            await ctx.send(ERROR_MESSAGES['invalid_position'])
+            return
+            
+        track = queue.remove(position - 1)
+        if position == 1:
+            self.schedule_prefetch(guild_id)
+        await ctx.send(f"🗑️ Removed **{track.title}** from the queue")
+
+    @commands.command(name='move', aliases=['mv'])
+    async def move(self, ctx, source: int, destination: int):
+        """Move a song to another position in the queue"""
+        guild_id = ctx.guild.id
+        queue = self.queues.get(guild_id)
+        
+        if not queue:
+            await ctx.send(ERROR_MESSAGES['queue_empty'])
+            return
+        if not (1 <= source <= len(queue) and 1 <= destination <= len(queue)):
+            await ctx.send(ERROR_MESSAGES['invalid_position'])
+            return
+            
+        track = queue.move(source - 1, destination - 1)
+        if 1 in (source, destination):
+            self.schedule_prefetch(guild_id)
+        await ctx.send(f"↕️ Moved **{track.title}** to position {destination}")
+
     @commands.command(name='clear')
     async def clear(self, ctx):
         """Clear the queue"""
         guild_id = ctx.guild.id
         
         if guild_id in self.queues:
-            self.queues[guild_id] = []
+            self.queues[guild_id].clear()
+            self.reset_prefetch(guild_id)
             await ctx.send("🗑️ Queue cleared!")
         else:
             await ctx.send(ERROR_MESSAGES['queue_empty'])
 
+    @commands.command(name='lag')
+    @commands.is_owner()
+    async def lag(self, ctx):
+        """Show recent event loop stalls (owner only)"""
+        if not self.watchdog or not self.watchdog.reports:
+            await ctx.send("✅ No event loop stalls recorded")
+            return
+        
+        embed = discord.Embed(title="🐢 Recent Event Loop Stalls", color=0xffaa00)
+        for report in list(self.watchdog.reports)[-5:]:
+            where = "\n".join(report['stack'][-3:]) or "unknown"
+            embed.add_field(
+                name=f"{report['duration']:.2f}s in {report['task']} <t:{int(report['time'])}:R>",
+                value=f"```{where[-1000:]}```",
+                inline=False
+            )
+        await ctx.send(embed=embed)
+
+    @commands.command(name='profile')
+    @commands.is_owner()
+    async def profile(self, ctx, seconds: int = 10):
+        """Sample the event loop thread and upload folded stacks for a flamegraph (owner only)"""
+        if self.profiling:
+            await ctx.send("❌ A profile is already running!")
+            return
+        seconds = max(1, min(seconds, PROFILE_MAX_SECONDS))
+        
+        self.profiling = True
+        try:
+            await ctx.send(f"🔬 Profiling for {seconds}s...")
+            profiler = SamplingProfiler(threading.get_ident())
+            folded = await self.loop.run_in_executor(None, profiler.run, seconds)
+        finally:
+            self.profiling = False
+        
+        await ctx.send(
+            "📊 Folded stacks, open with speedscope or flamegraph.pl",
+            file=discord.File(io.BytesIO(folded.encode()), filename=f'profile-{int(time.time())}.folded')
+        )
+
     @commands.command(name='help')
     async def help_command(self, ctx):
         """Show all available commands"""
@@ -550,11 +1147,14 @@ class MusicBot(commands.Bot):
                 f"`{DISCORD_PREFIX}resume` - Resume the paused song",
                 f"`{DISCORD_PREFIX}skip` - Skip the current song",
                 f"`{DISCORD_PREFIX}stop` - Stop music and clear queue",
-                f"`{DISCORD_PREFIX}nowplaying` - Show current song info"
+                f"`{DISCORD_PREFIX}nowplaying` - Show current song info",
+                f"`{DISCORD_PREFIX}suggest <search>` - Find songs played here before"
             ]),
             ("📋 Queue Commands", [
                 f"`{DISCORD_PREFIX}queue` - Show the current queue",
                 f"`{DISCORD_PREFIX}shuffle` - Shuffle the queue",
+                f"`{DISCORD_PREFIX}remove <position>` - Remove a song from the queue",
+                f"`{DISCORD_PREFIX}move <from> <to>` - Move a song in the queue",
                 f"`{DISCORD_PREFIX}clear` - Clear the queue"
             ]),
             ("🔊 Audio Commands", [
@@ -580,6 +1180,8 @@ class MusicBot(commands.Bot):
             return
         elif isinstance(error, commands.MissingRequiredArgument):
             await ctx.send(f"❌ Missing required argument: {error.param}")
+        elif isinstance(error, commands.NotOwner):
+            await ctx.send(ERROR_MESSAGES['not_owner'])
         elif isinstance(error, commands.BadArgument):
             await ctx.send("❌ Invalid argument provided!")
         else:
@@ -591,6 +1193,11 @@ def main():
         print("❌ Error: DISCORD_TOKEN not found in environment variables!")
         print("Please create a .env file with your bot token.")
         return
+    
+    if CLUSTER_WORKERS > 1:
+        from cluster import Cluster
+        Cluster().run()
+        return
         
     bot = MusicBot()
     bot.run(DISCORD_TOKEN)
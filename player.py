@@ -0,0 +1,316 @@
+import asyncio
+import enum
+import time
+import discord
+from config import (DEFAULT_VOLUME, ERROR_MESSAGES, PLAYER_MAX_CONSECUTIVE_FAILURES,
+                    PLAYER_MAX_RETRIES, PLAYER_RETRY_BACKOFF)
+from metrics import FIRST_AUDIO_LATENCY, PLAYBACK_FAILURES, TRACK_START_LATENCY, on_first_read
+
+
+class CapacityReached(Exception):
+    """Raised when a song can't start because the host is at its FFmpeg process limit"""
+
+
+class PlayerClosed(Exception):
+    """Raised to requests made to a player that was closed before it handled them"""
+
+
+class PlayerState(enum.Enum):
+    IDLE = 'idle'
+    LOADING = 'loading'
+    PLAYING = 'playing'
+    PAUSED = 'paused'
+
+
+class GuildPlayer:
+    """Playback actor for one guild.
+
+    Commands and voice events are posted to an inbox and handled one at a
+    time by a single task, so state changes never race. Handlers never
+    await; slow work (resolving, opening FFmpeg) runs in a load task that
+    reports back through the inbox. Only IDs are stored, the text channel
+    and voice client are looked up when they are needed.
+    """
+
+    def __init__(self, bot, guild_id, text_channel_id):
+        self.bot = bot
+        self.guild_id = guild_id
+        self.text_channel_id = text_channel_id
+        self.state = PlayerState.IDLE
+        self.volume = DEFAULT_VOLUME  # Applied to every song the guild plays
+        self.inbox = asyncio.Queue()
+        self.generation = 0  # Bumped for every song so stale callbacks are ignored
+        self.load_task = None
+        self.failures = []  # Songs skipped since the last one that played
+        self.started_at = None  # Wall-clock time the current song would have been at 0:00
+        self.paused_at = None
+        self.load_started = None  # perf_counter() when the current song started loading
+        self.play_requested_at = None  # perf_counter() of the command that started playback, until it is heard
+        self.closed = False
+        self.task = bot.loop.create_task(self.run())
+
+    @property
+    def voice_client(self):
+        guild = self.bot.get_guild(self.guild_id)
+        return guild.voice_client if guild else None
+
+    def post(self, command, *args):
+        """Queue a command without waiting for it"""
+        if not self.closed:
+            self.inbox.put_nowait((command, args, None))
+
+    async def request(self, command, *args):
+        """Queue a command and wait for its result; raises PlayerClosed if the player closes first"""
+        if self.closed:
+            raise PlayerClosed(f"Player for guild {self.guild_id} is closed")
+        future = self.bot.loop.create_future()
+        self.inbox.put_nowait((command, args, future))
+        return await future
+
+    async def run(self):
+        while True:
+            command, args, future = await self.inbox.get()
+            try:
+                result = getattr(self, f'on_{command}')(*args)
+            except Exception as e:
+                print(f"Error handling player command {command}: {e}")
+                if future and not future.done():
+                    future.set_exception(e)
+                continue
+            if future and not future.done():
+                future.set_result(result)
+
+    def position(self):
+        """Seconds into the current song, or None when nothing is playing"""
+        if self.started_at is None:
+            return None
+        return (self.paused_at or time.time()) - self.started_at
+
+    def close(self):
+        """Stop playback and the actor task, failing requests it will no longer handle"""
+        self.closed = True
+        self.on_stop()
+        self.task.cancel()
+        while not self.inbox.empty():
+            _, _, future = self.inbox.get_nowait()
+            if future and not future.done():
+                future.set_exception(PlayerClosed(f"Player for guild {self.guild_id} is closed"))
+
+    # Command handlers, only ever called from run()
+
+    def on_play(self, position=0, requested_at=None):
+        """Start playing the queue if nothing is playing yet, optionally part way into the first song"""
+        if self.state is not PlayerState.IDLE:
+            return False
+        self.play_requested_at = requested_at
+        self.start_next(position)
+        return True
+
+    def on_skip(self):
+        if self.state is PlayerState.LOADING:
+            self.start_next()
+            return True
+        if self.state in (PlayerState.PLAYING, PlayerState.PAUSED) and self.voice_client:
+            # The after callback posts 'finished', which moves on
+            self.voice_client.stop()
+            return True
+        return False
+
+    def on_stop(self):
+        """Stop playing, clear the queue and go idle"""
+        self.generation += 1
+        self.cancel_load()
+        self.state = PlayerState.IDLE
+        self.started_at = self.paused_at = None
+        self.failures.clear()
+        queue = self.bot.queues.get(self.guild_id)
+        if queue:
+            queue.clear()
+        self.bot.reset_prefetch(self.guild_id)
+        self.bot.current_song.pop(self.guild_id, None)
+        if self.voice_client:
+            self.voice_client.stop()
+        return True
+
+    def on_pause(self):
+        if self.state is PlayerState.PLAYING and self.voice_client and self.voice_client.is_playing():
+            self.voice_client.pause()
+            self.state = PlayerState.PAUSED
+            self.paused_at = time.time()
+            return True
+        return False
+
+    def on_resume(self):
+        if self.state is PlayerState.PAUSED and self.voice_client and self.voice_client.is_paused():
+            self.voice_client.resume()
+            self.state = PlayerState.PLAYING
+            self.started_at += time.time() - self.paused_at
+            self.paused_at = None
+            return True
+        if self.state is PlayerState.IDLE and self.bot.queues.get(self.guild_id):
+            # Stopped short of the queue's end, e.g. when the host was too busy
+            self.start_next()
+            return True
+        return False
+
+    def on_volume(self, volume):
+        """Set the guild's volume; returns whether the current song changed too"""
+        self.volume = volume
+        source = self.voice_client.source if self.voice_client else None
+        if source is None or not hasattr(source, 'volume'):
+            # Opus passthrough can't be scaled, the next song opens as PCM
+            return False
+        source.volume = volume
+        return True
+
+    def on_loaded(self, generation, track, position, task):
+        """A load task finished: play its source or move past the song"""
+        if generation != self.generation:
+            # Skipped or stopped while loading
+            if not task.cancelled() and task.exception() is None:
+                task.result().cleanup()
+            return
+        self.load_task = None
+
+        error = task.exception() if not task.cancelled() else asyncio.CancelledError()
+        if error is None:
+            source = on_first_read(task.result(), self.first_frame_callback())
+            try:
+                self.voice_client.play(source, after=lambda e: self.bot.loop.call_soon_threadsafe(
+                    self.post, 'finished', generation, e
+                ))
+            except Exception as e:
+                source.cleanup()
+                error = e
+
+        if isinstance(error, CapacityReached):
+            # Not the song's fault; keep it and the rest of the queue for later
+            queue = self.bot.queues.get(self.guild_id)
+            if queue is not None:
+                queue.appendleft(track)
+            self.go_idle()
+            self.notify(ERROR_MESSAGES['too_busy'])
+            return
+
+        if error is not None:
+            print(f"Error playing song: {error}")
+            PLAYBACK_FAILURES.inc()
+            self.failures.append(track)
+            if len(self.failures) >= PLAYER_MAX_CONSECUTIVE_FAILURES:
+                self.failures.clear()
+                self.go_idle()
+                self.notify(ERROR_MESSAGES['too_many_failures'])
+            else:
+                self.start_next()
+            return
+
+        self.state = PlayerState.PLAYING
+        self.started_at = time.time() - position
+        self.bot.schedule_prefetch(self.guild_id)
+        self.report_failures()
+        self.notify(embed=self.now_playing_embed(track))
+
+    def on_finished(self, generation, error):
+        """The voice client finished (or aborted) a song"""
+        if error:
+            print(f"Player error: {error}")
+        if generation != self.generation or self.state not in (PlayerState.PLAYING, PlayerState.PAUSED):
+            return
+        self.start_next()
+
+    # Helpers
+
+    def start_next(self, position=0):
+        """Begin loading the next queued song, or go idle"""
+        self.generation += 1
+        self.cancel_load()
+        self.started_at = self.paused_at = None
+        self.load_started = time.perf_counter()
+        queue = self.bot.queues.get(self.guild_id)
+        if not queue or not self.voice_client:
+            self.go_idle()
+            return
+
+        track = queue.popleft()
+        self.bot.current_song[self.guild_id] = track
+        self.state = PlayerState.LOADING
+        generation = self.generation
+        self.load_task = self.bot.loop.create_task(self.load(track, position))
+        self.load_task.add_done_callback(lambda task: self.post('loaded', generation, track, position, task))
+
+    async def load(self, track, position=0):
+        """Resolve a song and open its audio source, retrying with backoff"""
+        if not await self.bot.ensure_resolved(track, self.guild_id):
+            raise LookupError(f"No YouTube match for {track.query}")
+
+        delay = PLAYER_RETRY_BACKOFF
+        for attempt in range(PLAYER_MAX_RETRIES + 1):
+            try:
+                return await self.bot.open_source(self.guild_id, track, position)
+            except CapacityReached:
+                raise
+            except Exception as e:
+                if attempt == PLAYER_MAX_RETRIES:
+                    raise
+                print(f"Error opening stream (attempt {attempt + 1}), retrying: {e}")
+                # The cached stream URL may be what broke
+                self.bot.stream_cache.discard(track.url)
+                await asyncio.sleep(delay)
+                delay *= 2
+
+    def first_frame_callback(self):
+        """Callback that records start-up latency when the first frame is read"""
+        load_started, requested_at = self.load_started, self.play_requested_at
+        self.play_requested_at = None
+
+        def record():
+            now = time.perf_counter()
+            TRACK_START_LATENCY.observe(now - load_started)
+            if requested_at is not None:
+                FIRST_AUDIO_LATENCY.observe(now - requested_at)
+        return record
+
+    def cancel_load(self):
+        if self.load_task:
+            self.load_task.cancel()
+            self.load_task = None
+
+    def go_idle(self):
+        self.state = PlayerState.IDLE
+        self.play_requested_at = None
+        self.started_at = self.paused_at = None
+        self.bot.current_song.pop(self.guild_id, None)
+        self.report_failures()
+
+    def report_failures(self):
+        """Send one message for all the songs skipped since the last one played"""
+        if not self.failures:
+            return
+        names = ", ".join(track.title for track in self.failures[:5])
+        if len(self.failures) > 5:
+            names += f" and {len(self.failures) - 5} more"
+        self.notify(f"❌ Couldn't play {len(self.failures)} songs, skipped: {names}")
+        self.failures.clear()
+
+    def now_playing_embed(self, track):
+        embed = discord.Embed(
+            title="🎵 Now Playing",
+            description=f"**{track.title}**\nDuration: {track.duration_str}",
+            color=0x00ff00
+        )
+        embed.set_thumbnail(url=track.thumbnail)
+        embed.add_field(name="Requested by", value=track.requester, inline=True)
+        embed.add_field(name="Queue", value=f"{len(self.bot.queues.get(self.guild_id) or ())} songs", inline=True)
+        return embed
+
+    def notify(self, content=None, embed=None):
+        """Send a message to the guild's music channel without blocking the actor"""
+        channel = self.bot.get_channel(self.text_channel_id)
+        if channel:
+            self.bot.loop.create_task(self._send(channel, content, embed))
+
+    async def _send(self, channel, content, embed):
+        try:
+            await channel.send(content=content, embed=embed)
+        except discord.HTTPException as e:
+            print(f"Error sending player message: {e}")
@@ -0,0 +1,57 @@
+import asyncio
+import time
+import discord
+from config import PROGRESS_EDIT_INTERVAL
+
+
+class ProgressMessage:
+    """Status message that is edited at most once per interval.
+
+    update() only records the latest state and edits the message once the
+    interval since the previous edit has passed; states replaced in the
+    meantime are never sent. edit() sends the final state right away,
+    after any edit already on its way, so the message always ends on it.
+    """
+
+    def __init__(self, message, interval=PROGRESS_EDIT_INTERVAL):
+        self.message = message
+        self.interval = interval
+        self.pending = None  # Latest fields not yet sent
+        self.last_edit = time.monotonic()  # Sending the message counts as the first edit
+        self.task = None
+        self.sleeping = False  # Whether the task is still waiting out the interval
+        self.lock = asyncio.Lock()  # Keeps edits in order
+
+    def update(self, **fields):
+        """Show an intermediate state, without waiting for it to be sent"""
+        self.pending = fields
+        if self.task is None or self.task.done():
+            self.task = asyncio.get_running_loop().create_task(self._flush_later())
+
+    async def edit(self, **fields):
+        """Show the final state, dropping any intermediate one still waiting"""
+        self.pending = fields
+        if self.sleeping:
+            # An edit already under way is left to finish; the lock orders ours after it
+            self.task.cancel()
+            self.sleeping = False
+        await self._flush()
+
+    async def _flush_later(self):
+        self.sleeping = True
+        try:
+            await asyncio.sleep(max(self.last_edit + self.interval - time.monotonic(), 0))
+        finally:
+            self.sleeping = False
+        await self._flush()
+
+    async def _flush(self):
+        async with self.lock:
+            fields, self.pending = self.pending, None
+            if fields is None:
+                return
+            self.last_edit = time.monotonic()
+            try:
+                await self.message.edit(**fields)
+            except discord.HTTPException as e:
+                print(f"Error editing progress message: {e}")
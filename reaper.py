@@ -0,0 +1,122 @@
+import asyncio
+import time
+from config import (REAPER_INTERVAL, VOICE_EMPTY_LEAVE_AFTER, VOICE_EMPTY_PAUSE_AFTER,
+                    VOICE_IDLE_LEAVE_AFTER)
+from player import PlayerClosed
+
+
+def listeners(voice_client):
+    """Members other than bots in the bot's voice channel"""
+    channel = voice_client.channel
+    return [member for member in getattr(channel, 'members', ()) if not member.bot]
+
+
+class VoiceReaper:
+    """Leaves voice channels nobody is using and frees the guild's state.
+
+    Voice state events keep track of when the bot's channel emptied; a
+    periodic sweep pauses playback in empty channels, then leaves them, and
+    also leaves channels where nothing has played for a while. When the
+    voice session cap is reached, the longest-unused session can be shed to
+    make room for a new one.
+    """
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.empty_since = {}  # Guild ID -> monotonic time its channel lost its last listener
+        self.idle_since = {}  # Guild ID -> monotonic time the player was last seen idle
+        self.auto_paused = set()  # Guilds paused by the reaper, resumed when someone returns
+        self.task = None
+
+    def start(self):
+        if self.task is None:
+            self.task = self.bot.loop.create_task(self.run())
+
+    def stop(self):
+        if self.task:
+            self.task.cancel()
+            self.task = None
+
+    def forget(self, guild_id):
+        self.empty_since.pop(guild_id, None)
+        self.idle_since.pop(guild_id, None)
+        self.auto_paused.discard(guild_id)
+
+    def voice_state_changed(self, guild):
+        """Re-check a guild's channel after someone joined, left or moved"""
+        voice_client = guild.voice_client
+        if voice_client is None:
+            self.forget(guild.id)
+            return
+        if listeners(voice_client):
+            self.empty_since.pop(guild.id, None)
+            if guild.id in self.auto_paused:
+                self.auto_paused.discard(guild.id)
+                player = self.bot.players.get(guild.id)
+                if player:
+                    player.post('resume')
+        else:
+            self.empty_since.setdefault(guild.id, time.monotonic())
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(REAPER_INTERVAL)
+            try:
+                await self.sweep()
+            except Exception as e:
+                print(f"Error reaping idle voice sessions: {e}")
+
+    async def sweep(self):
+        now = time.monotonic()
+        connected = set()
+        for voice_client in list(self.bot.voice_clients):
+            guild = voice_client.guild
+            connected.add(guild.id)
+            self.voice_state_changed(guild)
+
+            if self.bot.is_idle(guild.id):
+                self.idle_since.setdefault(guild.id, now)
+            else:
+                self.idle_since.pop(guild.id, None)
+
+            empty_for = now - self.empty_since.get(guild.id, now)
+            idle_for = now - self.idle_since.get(guild.id, now)
+            if empty_for >= VOICE_EMPTY_LEAVE_AFTER:
+                await self.leave(guild, "👋 Left the voice channel because everyone else left.")
+            elif idle_for >= VOICE_IDLE_LEAVE_AFTER:
+                await self.leave(guild, "👋 Left the voice channel because nothing was playing.")
+            elif empty_for >= VOICE_EMPTY_PAUSE_AFTER and guild.id not in self.auto_paused:
+                player = self.bot.players.get(guild.id)
+                try:
+                    if player and await player.request('pause'):
+                        self.auto_paused.add(guild.id)
+                except PlayerClosed:
+                    # Released while the pause was waiting; nothing left to pause
+                    pass
+
+        # Guilds the bot was disconnected from some other way
+        for guild_id in (set(self.empty_since) | set(self.idle_since)) - connected:
+            self.forget(guild_id)
+
+    async def leave(self, guild, message=None):
+        """Disconnect from a guild's voice channel and free everything kept for it"""
+        player = self.bot.players.get(guild.id)
+        if message and player:
+            player.notify(message)
+        if guild.voice_client:
+            await guild.voice_client.disconnect()
+        self.bot.release_guild(guild.id)
+        self.forget(guild.id)
+
+    async def shed(self):
+        """Leave the session that has been unused the longest to make room; returns success"""
+        # Empty channels first, then idle ones, longest unused first
+        unused = sorted(self.empty_since.items(), key=lambda item: item[1])
+        unused += sorted((item for item in self.idle_since.items() if item[0] not in self.empty_since),
+                         key=lambda item: item[1])
+        for guild_id, _ in unused:
+            guild = self.bot.get_guild(guild_id)
+            if guild and guild.voice_client:
+                await self.leave(guild, "👋 Left the voice channel to make room for another server.")
+                return True
+        return False
@@ -0,0 +1,186 @@
+import asyncio
+import concurrent.futures
+from config import (RESOLVER_WORKERS, RESOLVER_TIMEOUT, RESOLVER_USE_PROCESSES,
+                    AUDIO_CACHE_DOWNLOAD_WORKERS, AUDIO_CACHE_DOWNLOAD_TIMEOUT)
+from metrics import YTDLP_LATENCY, YTDLP_TIMEOUTS
+from scheduler import FairScheduler
+from search_cache import SearchCache
+from single_flight import SingleFlight, video_key
+
+_yt_dlp = None
+
+
+def load_yt_dlp():
+    """Import yt-dlp on first use; it is slow to import and not needed to connect"""
+    global _yt_dlp
+    if _yt_dlp is None:
+        import yt_dlp
+        # Suppress noise about console usage from errors
+        yt_dlp.utils.bug_reports_message = lambda: ''
+        _yt_dlp = yt_dlp
+    return _yt_dlp
+
+
+def _warm_up():
+    load_yt_dlp()
+
+
+class ResolverTimeout(Exception):
+    """Raised when an extraction takes longer than the allowed time"""
+
+
+def _extract_info(ytdl_options, query, download=False):
+    """Run a single yt-dlp extraction (executed inside a pool worker)"""
+    with load_yt_dlp().YoutubeDL(ytdl_options) as ydl:
+        info = ydl.extract_info(query, download=download)
+        # Make sure the result can cross a process boundary
+        return ydl.sanitize_info(info)
+
+
+class YTDLResolver:
+    """Runs yt-dlp extractions off the event loop in a bounded worker pool"""
+
+    def __init__(self, ytdl_options, cache=None, workers=RESOLVER_WORKERS, timeout=RESOLVER_TIMEOUT,
+                 use_processes=RESOLVER_USE_PROCESSES, extractor=_extract_info):
+        self.ytdl_options = ytdl_options
+        self.cache = cache
+        self.extractor = extractor  # Called in a worker as extractor(ytdl_options, query, download)
+        self.timeout = timeout
+        self.workers = workers
+        self.pending = set()
+        self.flights = SingleFlight('youtube')  # Identical concurrent lookups share one extraction
+        self.scheduler = FairScheduler(workers)  # Decides which guild's job gets the next free worker
+        self.use_processes = use_processes
+        if use_processes:
+            self.executor = concurrent.futures.ProcessPoolExecutor(max_workers=workers)
+        else:
+            self.executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=workers, thread_name_prefix='ytdl-resolver'
+            )
+        # Downloads get their own pool so they never hold up interactive lookups
+        self.download_executor = None
+
+    async def extract(self, query, download=False, timeout=None, guild_id=None, bulk=False, names=()):
+        """Extract info for a URL or search query without blocking the event loop.
+
+        Jobs wait for a worker in the fair scheduler, under the requesting
+        guild; bulk jobs (look-ahead for queued songs) yield to commands.
+        Cancelling the awaiting task abandons the extraction: jobs still waiting
+        for a worker are dropped, running jobs finish in the background and
+        their result is discarded. Concurrent extractions of the same video or
+        search share one job, which is only abandoned once every caller has.
+        A bulk job a command joins is promoted to the command's priority.
+        """
+        if download:
+            return await self._scheduled_run(query, download, timeout or self.timeout, guild_id, bulk, names)
+        key = ('extract', video_key(query))
+        if not bulk:
+            self.scheduler.promote(key)
+        return await self.flights.run(key, lambda: self._scheduled_run(
+            query, download, timeout or self.timeout, guild_id, bulk, names + (key,)
+        ))
+
+    def promote_search(self, query):
+        """Give a search already waiting as background work the priority of a command"""
+        self.scheduler.promote(('search', SearchCache.query_key(query)))
+
+    async def _scheduled_run(self, query, download, timeout, guild_id, bulk, names):
+        await self.scheduler.acquire(guild_id, bulk, names)
+        loop = asyncio.get_running_loop()
+        return await self._run(self.executor, self.ytdl_options, query, download, timeout,
+                               on_done=lambda _: self._release_slot(loop))
+
+    def _release_slot(self, loop):
+        """Hand a finished job's worker back to the scheduler (called from the worker thread)"""
+        if not loop.is_closed():
+            loop.call_soon_threadsafe(self.scheduler.release)
+
+    async def warm_up(self):
+        """Import yt-dlp in the workers ahead of the first lookup"""
+        loop = asyncio.get_running_loop()
+        if self.use_processes:
+            # Each worker process imports it separately
+            await asyncio.gather(*(loop.run_in_executor(self.executor, _warm_up) for _ in range(self.workers)))
+        else:
+            await loop.run_in_executor(self.executor, _warm_up)
+
+    async def download(self, url, options, timeout=AUDIO_CACHE_DOWNLOAD_TIMEOUT):
+        """Download a track with extra yt-dlp options (format, outtmpl, ...)"""
+        if self.download_executor is None:
+            self.download_executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=AUDIO_CACHE_DOWNLOAD_WORKERS, thread_name_prefix='ytdl-download'
+            )
+        return await self._run(self.download_executor, dict(self.ytdl_options, **options), url, True, timeout)
+
+    async def _run(self, executor, ytdl_options, query, download, timeout, on_done=None):
+        loop = asyncio.get_running_loop()
+        operation = 'download' if download else 'extract'
+        future = executor.submit(self.extractor, ytdl_options, query, download)
+        self.pending.add(future)
+        future.add_done_callback(self.pending.discard)
+        if on_done:
+            # Runs when the worker is actually free, not when the caller stops waiting
+            future.add_done_callback(on_done)
+        try:
+            with YTDLP_LATENCY.time(operation):
+                return await asyncio.wait_for(asyncio.wrap_future(future, loop=loop), timeout=timeout)
+        except asyncio.TimeoutError:
+            future.cancel()
+            YTDLP_TIMEOUTS.inc(operation)
+            raise ResolverTimeout(f"Extraction timed out after {timeout}s: {query}")
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+
+    async def search(self, query, timeout=None, guild_id=None, bulk=False):
+        """Return the first YouTube search result for a query, or None.
+
+        Cached results only carry the metadata fields stored by the cache.
+        """
+        key = ('search', SearchCache.query_key(query))
+        if not bulk:
+            self.scheduler.promote(key)
+        return await self.flights.run(key, lambda: self._search(query, timeout, guild_id, bulk, key))
+
+    async def _search(self, query, timeout, guild_id, bulk, key):
+        if self.cache:
+            cached = self.cache.get(self.cache.query_key(query))
+            if cached:
+                return cached
+
+        info = await self.extract(f"ytsearch:{query}", timeout=timeout, guild_id=guild_id, bulk=bulk, names=(key,))
+        if not info or not info.get('entries'):
+            return None
+        info = info['entries'][0]
+
+        if self.cache and info.get('webpage_url'):
+            self.cache.put([self.cache.query_key(query), self.cache.url_key(info['webpage_url'])], info)
+        return info
+
+    async def metadata(self, url, timeout=None, guild_id=None, bulk=False):
+        """Return track metadata for a URL, served from the cache when possible"""
+        key = ('metadata', video_key(url))
+        if not bulk:
+            self.scheduler.promote(key)
+        return await self.flights.run(key, lambda: self._metadata(url, timeout, guild_id, bulk, key))
+
+    async def _metadata(self, url, timeout, guild_id, bulk, key):
+        if self.cache:
+            cached = self.cache.get(self.cache.url_key(url))
+            if cached:
+                return cached
+
+        info = await self.extract(url, timeout=timeout, guild_id=guild_id, bulk=bulk, names=(key,))
+        if self.cache and info and info.get('webpage_url'):
+            self.cache.put({self.cache.url_key(url), self.cache.url_key(info['webpage_url'])}, info)
+        return info
+
+    def close(self):
+        """Shut down the worker pool, dropping any queued extractions"""
+        for future in list(self.pending):
+            future.cancel()
+        self.executor.shutdown(wait=False)
+        if self.download_executor:
+            self.download_executor.shutdown(wait=False)
+        if self.cache:
+            self.cache.close()
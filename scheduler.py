@@ -0,0 +1,193 @@
+import asyncio
+import time
+from collections import OrderedDict, deque
+from config import RESOLVER_GUILD_BURST, RESOLVER_GUILD_RATE, RESOLVER_INTERACTIVE_WEIGHT
+
+MAX_IDLE_BUCKETS = 256  # Full buckets are dropped past this many; a new one starts full anyway
+
+
+class TokenBucket:
+    __slots__ = ('rate', 'capacity', 'tokens', 'updated')
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def ready(self):
+        self.refill()
+        return self.tokens >= 1
+
+    def take(self):
+        self.tokens -= 1
+
+    def wait_time(self):
+        """Seconds until the next token is available"""
+        return max((1 - self.tokens) / self.rate, 0)
+
+
+class FairScheduler:
+    """Hands out extraction slots fairly between guilds.
+
+    Interactive jobs (a user waiting on a command) go before bulk jobs
+    (playlist look-ahead, prefetching), but every RESOLVER_INTERACTIVE_WEIGHT
+    interactive jobs let one waiting bulk job through so imports keep
+    moving. Within each class, guilds take turns. Bulk jobs also draw from
+    a per-guild token bucket, so one guild's import can't flood the pool
+    even when it is otherwise idle. A waiting bulk job is promoted to
+    interactive when a command starts waiting on the same lookup.
+    """
+
+    def __init__(self, slots, rate=RESOLVER_GUILD_RATE, burst=RESOLVER_GUILD_BURST,
+                 interactive_weight=RESOLVER_INTERACTIVE_WEIGHT):
+        self.free = slots
+        self.rate = rate
+        self.burst = burst
+        self.interactive_weight = interactive_weight
+        self.interactive = OrderedDict()  # Guild ID -> deque of waiting futures, in turn order
+        self.bulk = OrderedDict()
+        self.buckets = {}  # Guild ID -> TokenBucket for bulk jobs
+        self.jobs = {}  # Lookup name -> (guild ID, future) of a waiting bulk job, for promote()
+        self.interactive_streak = 0  # Interactive jobs let through since the last bulk one
+        self.timer = None  # Wakes dispatch() when a bucket refills
+
+    def bucket(self, guild_id):
+        bucket = self.buckets.get(guild_id)
+        if bucket is None:
+            bucket = self.buckets[guild_id] = TokenBucket(self.rate, self.burst)
+        return bucket
+
+    async def acquire(self, guild_id=None, bulk=False, names=()):
+        """Wait for an extraction slot; the caller must release() it when the job is done.
+
+        names identify the lookups a bulk job serves, so it can be promoted.
+        """
+        queues = self.bulk if bulk else self.interactive
+        future = asyncio.get_running_loop().create_future()
+        queues.setdefault(guild_id, deque()).append(future)
+        if bulk:
+            for name in names:
+                self.jobs[name] = (guild_id, future)
+        self.dispatch()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Granted just as the caller gave up
+                self.release()
+            else:
+                # It may have been promoted since
+                self._forget(self.bulk, guild_id, future)
+                self._forget(self.interactive, guild_id, future)
+            raise
+        finally:
+            self._unname(future)
+
+    def promote(self, name):
+        """Move a waiting bulk job to the interactive class; returns whether there was one"""
+        job = self.jobs.get(name)
+        if job is None:
+            return False
+        guild_id, future = job
+        self._unname(future)
+        if future.done():
+            return False
+        self._forget(self.bulk, guild_id, future)
+        self.interactive.setdefault(guild_id, deque()).append(future)
+        self.dispatch()
+        return True
+
+    def _unname(self, future):
+        for name, job in list(self.jobs.items()):
+            if job[1] is future:
+                del self.jobs[name]
+
+    def release(self):
+        self.free += 1
+        if len(self.buckets) > MAX_IDLE_BUCKETS:
+            self.prune()
+        self.dispatch()
+
+    def dispatch(self):
+        """Grant free slots to waiting jobs"""
+        while self.free:
+            future = self._next()
+            if future is None:
+                break
+            self.free -= 1
+            future.set_result(None)
+
+    def waiting(self):
+        """Jobs waiting for a slot, by class"""
+        return {
+            ('interactive',): sum(len(waiting) for waiting in self.interactive.values()),
+            ('bulk',): sum(len(waiting) for waiting in self.bulk.values()),
+        }
+
+    def _next(self):
+        take_bulk = self.bulk and (not self.interactive or self.interactive_streak >= self.interactive_weight)
+        if take_bulk:
+            future = self._pop(self.bulk, bulk=True)
+            if future is not None:
+                self.interactive_streak = 0
+                return future
+        future = self._pop(self.interactive, bulk=False)
+        if future is not None:
+            self.interactive_streak += 1
+            return future
+        return None
+
+    def _pop(self, queues, bulk):
+        """Take the first job of the next guild in turn, moving that guild to the back"""
+        for guild_id in list(queues):
+            if bulk:
+                bucket = self.bucket(guild_id)
+                if not bucket.ready():
+                    continue
+            waiting = queues.pop(guild_id)
+            # Skip callers that gave up but haven't been forgotten yet
+            while waiting and waiting[0].done():
+                waiting.popleft()
+            if not waiting:
+                continue
+            future = waiting.popleft()
+            if waiting:
+                queues[guild_id] = waiting
+            if bulk:
+                bucket.take()
+            return future
+        if bulk and queues:
+            self._wake_after(min(self.bucket(guild_id).wait_time() for guild_id in queues))
+        return None
+
+    def _wake_after(self, delay):
+        if self.timer is None:
+            self.timer = asyncio.get_running_loop().call_later(delay, self._wake)
+
+    def _wake(self):
+        self.timer = None
+        self.dispatch()
+
+    def _forget(self, queues, guild_id, future):
+        waiting = queues.get(guild_id)
+        if waiting is None:
+            return
+        try:
+            waiting.remove(future)
+        except ValueError:
+            pass
+        if not waiting:
+            del queues[guild_id]
+
+    def prune(self):
+        """Drop token buckets that are full again"""
+        for guild_id, bucket in list(self.buckets.items()):
+            bucket.refill()
+            if bucket.tokens >= bucket.capacity and guild_id not in self.bulk:
+                del self.buckets[guild_id]
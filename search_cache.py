@@ -0,0 +1,134 @@
+import os
+import re
+import sqlite3
+import time
+from config import SEARCH_CACHE_PATH, SEARCH_CACHE_TTL, SEARCH_CACHE_MAX_ENTRIES
+
+# Metadata fields kept for each resolved query
+CACHED_FIELDS = ('title', 'webpage_url', 'duration', 'thumbnail')
+FLUSH_INTERVAL = 60  # Seconds hits are kept in memory before their last_used times are written
+
+
+class SearchCache:
+    """Persistent query/URL -> track metadata cache with TTL and LRU eviction.
+
+    A hit only reads the database; when entries were last used is written
+    in batches every FLUSH_INTERVAL seconds, on the next write, and on close.
+    """
+
+    def __init__(self, path=SEARCH_CACHE_PATH, ttl=SEARCH_CACHE_TTL, max_entries=SEARCH_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.touched = {}  # Key -> last_used time not yet written
+        self.expired = set()  # Keys found expired, not yet deleted
+        self.last_flush = time.monotonic()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.db = sqlite3.connect(path)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS search_cache (
+                key TEXT PRIMARY KEY,
+                title TEXT,
+                webpage_url TEXT,
+                duration INTEGER,
+                thumbnail TEXT,
+                created_at REAL NOT NULL,
+                last_used REAL NOT NULL
+            )
+        """)
+        self.db.execute('CREATE INDEX IF NOT EXISTS idx_search_cache_last_used ON search_cache (last_used)')
+        self.db.commit()
+
+    @staticmethod
+    def query_key(query):
+        """Normalize a search query so trivially different spellings share an entry"""
+        return 'q:' + re.sub(r'\s+', ' ', query).strip().lower()
+
+    @staticmethod
+    def url_key(url):
+        """Cache key for a webpage URL"""
+        return 'url:' + url.strip()
+
+    def get(self, key):
+        """Return cached metadata for a key, or None if missing or expired"""
+        row = self.db.execute(
+            'SELECT title, webpage_url, duration, thumbnail, created_at FROM search_cache WHERE key = ?',
+            (key,)
+        ).fetchone()
+        now = time.time()
+
+        result = None
+        if row is None or now - row[4] > self.ttl:
+            if row is not None:
+                self.expired.add(key)
+                self.touched.pop(key, None)
+            self.misses += 1
+        else:
+            self.touched[key] = now
+            self.hits += 1
+            result = dict(zip(CACHED_FIELDS, row[:4]))
+        if time.monotonic() - self.last_flush >= FLUSH_INTERVAL:
+            self.flush()
+        return result
+
+    def put(self, keys, info):
+        """Store the metadata of a resolved track under one or more keys"""
+        now = time.time()
+        values = [info.get(field) for field in CACHED_FIELDS]
+        values[2] = int(values[2]) if values[2] else None
+        for key in keys:
+            self.touched.pop(key, None)
+            self.expired.discard(key)
+        self.db.executemany(
+            'INSERT OR REPLACE INTO search_cache VALUES (?, ?, ?, ?, ?, ?, ?)',
+            [(key, *values, now, now) for key in keys]
+        )
+        # Eviction needs the recent hits
+        self._write_pending()
+        self._evict()
+        self.db.commit()
+
+    def flush(self):
+        """Write the hits and expiries kept in memory"""
+        self._write_pending()
+        self.db.commit()
+
+    def _write_pending(self):
+        if self.touched:
+            self.db.executemany('UPDATE search_cache SET last_used = ? WHERE key = ?',
+                                [(last_used, key) for key, last_used in self.touched.items()])
+            self.touched.clear()
+        if self.expired:
+            self.db.executemany('DELETE FROM search_cache WHERE key = ?', [(key,) for key in self.expired])
+            self.expired.clear()
+        self.last_flush = time.monotonic()
+
+    def _evict(self):
+        """Drop the least recently used entries beyond the size limit"""
+        count = self.db.execute('SELECT COUNT(*) FROM search_cache').fetchone()[0]
+        if count > self.max_entries:
+            self.db.execute(
+                'DELETE FROM search_cache WHERE key IN '
+                '(SELECT key FROM search_cache ORDER BY last_used ASC LIMIT ?)',
+                (count - self.max_entries,)
+            )
+
+    def stats(self):
+        """Return hit/miss counters and the current number of entries"""
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / total if total else 0.0,
+            'entries': self.db.execute('SELECT COUNT(*) FROM search_cache').fetchone()[0]
+        }
+
+    def close(self):
+        self.flush()
+        self.db.close()
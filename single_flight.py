@@ -0,0 +1,55 @@
+import asyncio
+import re
+from metrics import COALESCED_LOOKUPS
+
+YOUTUBE_ID_PATTERN = re.compile(r'(?:youtube\.com/(?:watch\?(?:.*&)?v=|shorts/|embed/|live/)|youtu\.be/)([\w-]{11})')
+
+
+def video_key(url):
+    """Key shared by every spelling of a YouTube video URL"""
+    match = YOUTUBE_ID_PATTERN.search(url)
+    return f'yt:{match.group(1)}' if match else url.strip()
+
+
+class _Flight:
+    __slots__ = ('task', 'waiters')
+
+    def __init__(self, task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Lets concurrent callers asking for the same key share one in-flight call.
+
+    The call runs in its own task; each caller awaits it through a shield,
+    so one caller being cancelled doesn't fail the others. The call is only
+    cancelled once every caller has given up on it.
+    """
+
+    def __init__(self, name):
+        self.name = name  # Label for the coalesced lookups metric
+        self.flights = {}  # Key -> _Flight
+
+    async def run(self, key, factory):
+        """Await factory() for this key, joining a call already in flight if there is one"""
+        flight = self.flights.get(key)
+        if flight is None:
+            flight = self.flights[key] = _Flight(asyncio.ensure_future(factory()))
+            flight.task.add_done_callback(lambda _: self._finished(key, flight))
+        else:
+            COALESCED_LOOKUPS.inc(self.name)
+
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+            if not flight.waiters and not flight.task.done():
+                flight.task.cancel()
+                # Later callers start a fresh call instead of joining a cancelled one
+                self._finished(key, flight)
+
+    def _finished(self, key, flight):
+        if self.flights.get(key) is flight:
+            del self.flights[key]
@@ -0,0 +1,74 @@
+import gzip
+import json
+import os
+import time
+from config import SNAPSHOT_DIR, SNAPSHOT_MAX_AGE
+
+SNAPSHOT_VERSION = 1
+
+
+class SnapshotStore:
+    """Per-guild gzipped JSON snapshots of queues and playback state.
+
+    Each guild lives in its own file so only guilds that changed are
+    rewritten. A separate heartbeat file records when the bot was last
+    alive, which bounds how far playback positions can have drifted.
+    """
+
+    def __init__(self, directory=SNAPSHOT_DIR, heartbeat_name='heartbeat'):
+        self.directory = directory
+        self.heartbeat_path = os.path.join(directory, heartbeat_name)
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, guild_id):
+        return os.path.join(self.directory, f'{guild_id}.json.gz')
+
+    def save(self, guild_id, snapshot):
+        """Write one guild's snapshot atomically"""
+        path = self.path(guild_id)
+        with gzip.open(path + '.tmp', 'wt', encoding='utf-8') as f:
+            json.dump(dict(snapshot, v=SNAPSHOT_VERSION), f, separators=(',', ':'))
+        os.replace(path + '.tmp', path)
+
+    def delete(self, guild_id):
+        try:
+            os.remove(self.path(guild_id))
+        except FileNotFoundError:
+            pass
+
+    def heartbeat(self):
+        with open(self.heartbeat_path + '.tmp', 'w') as f:
+            f.write(str(time.time()))
+        os.replace(self.heartbeat_path + '.tmp', self.heartbeat_path)
+
+    def last_heartbeat(self):
+        """Time of the last heartbeat, or None"""
+        try:
+            with open(self.heartbeat_path) as f:
+                return float(f.read())
+        except (OSError, ValueError):
+            return None
+
+    def load_all(self, max_age=SNAPSHOT_MAX_AGE):
+        """Read every snapshot; stale, corrupt and old-format files are removed"""
+        snapshots = {}
+        now = time.time()
+        for filename in os.listdir(self.directory):
+            if not filename.endswith('.json.gz'):
+                continue
+            path = os.path.join(self.directory, filename)
+            try:
+                if now - os.path.getmtime(path) > max_age:
+                    os.remove(path)
+                    continue
+                with gzip.open(path, 'rt', encoding='utf-8') as f:
+                    snapshot = json.load(f)
+                if snapshot.get('v') != SNAPSHOT_VERSION:
+                    raise ValueError(f"unsupported snapshot version {snapshot.get('v')}")
+            except (OSError, EOFError, ValueError) as e:
+                print(f"Discarding snapshot {filename}: {e}")
+                if os.path.exists(path):
+                    os.remove(path)
+                continue
+            snapshots[snapshot['guild_id']] = snapshot
+        return snapshots
@@ -0,0 +1,133 @@
+import asyncio
+import base64
+import time
+import aiohttp
+from config import (SPOTIFY_CLIENT_ID, SPOTIFY_CLIENT_SECRET, SPOTIFY_MAX_RETRIES,
+                    SPOTIFY_REQUEST_TIMEOUT, SPOTIFY_TOKEN_REFRESH_MARGIN)
+from metrics import SPOTIFY_ERRORS, SPOTIFY_LATENCY
+
+API_URL = 'https://api.spotify.com/v1'
+TOKEN_URL = 'https://accounts.spotify.com/api/token'
+
+
+class SpotifyError(Exception):
+    """Raised when the Spotify Web API returns an error"""
+
+    def __init__(self, status, message):
+        super().__init__(f"Spotify API error {status}: {message}")
+        self.status = status
+
+
+class AsyncSpotifyClient:
+    """Minimal asyncio Spotify Web API client using the client-credentials flow"""
+
+    def __init__(self, client_id=SPOTIFY_CLIENT_ID, client_secret=SPOTIFY_CLIENT_SECRET):
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.session = None
+        self.token = None
+        self.token_expires_at = 0
+        self.token_lock = None  # Created lazily so it binds to the running loop
+
+    def _get_session(self):
+        """Create the pooled HTTP session on first use (needs a running loop)"""
+        if self.session is None or self.session.closed:
+            self.session = aiohttp.ClientSession(
+                timeout=aiohttp.ClientTimeout(total=SPOTIFY_REQUEST_TIMEOUT),
+                connector=aiohttp.TCPConnector(limit=20, ttl_dns_cache=300)
+            )
+        return self.session
+
+    async def _get_token(self):
+        """Return a valid access token, refreshing it shortly before it expires"""
+        if self.token and time.time() < self.token_expires_at - SPOTIFY_TOKEN_REFRESH_MARGIN:
+            return self.token
+
+        if self.token_lock is None:
+            self.token_lock = asyncio.Lock()
+        async with self.token_lock:
+            # Another request may have refreshed it while we waited
+            if self.token and time.time() < self.token_expires_at - SPOTIFY_TOKEN_REFRESH_MARGIN:
+                return self.token
+
+            credentials = base64.b64encode(f"{self.client_id}:{self.client_secret}".encode()).decode()
+            async with self._get_session().post(
+                TOKEN_URL,
+                data={'grant_type': 'client_credentials'},
+                headers={'Authorization': f'Basic {credentials}'}
+            ) as response:
+                payload = await response.json(content_type=None)
+                if response.status != 200:
+                    raise SpotifyError(response.status, payload.get('error_description', payload))
+
+            self.token = payload['access_token']
+            self.token_expires_at = time.time() + payload.get('expires_in', 3600)
+            return self.token
+
+    async def request(self, url, params=None):
+        """GET an API path or absolute URL, retrying rate limits and server errors"""
+        if not url.startswith('http'):
+            url = API_URL + url
+
+        # First path segment (tracks, albums, playlists, ...) keeps the label set small
+        endpoint = url[len(API_URL):].lstrip('/').split('/')[0].split('?')[0] if url.startswith(API_URL) else 'other'
+        with SPOTIFY_LATENCY.time(endpoint):
+            try:
+                return await self._request(url, params)
+            except Exception:
+                SPOTIFY_ERRORS.inc(endpoint)
+                raise
+
+    async def _request(self, url, params):
+        for attempt in range(SPOTIFY_MAX_RETRIES + 1):
+            token = await self._get_token()
+            async with self._get_session().get(
+                url, params=params, headers={'Authorization': f'Bearer {token}'}
+            ) as response:
+                if response.status == 200:
+                    return await response.json()
+
+                if response.status == 401:
+                    # Token revoked or expired early: force a refresh and retry
+                    self.token = None
+                    continue
+
+                if response.status == 429 or response.status >= 500:
+                    if attempt == SPOTIFY_MAX_RETRIES:
+                        raise SpotifyError(response.status, 'retries exhausted')
+                    retry_after = response.headers.get('Retry-After')
+                    delay = float(retry_after) if retry_after else min(2 ** attempt, 30)
+                    await asyncio.sleep(delay)
+                    continue
+
+                payload = await response.json(content_type=None)
+                error = payload.get('error', {}) if isinstance(payload, dict) else {}
+                raise SpotifyError(response.status, error.get('message', payload))
+
+        raise SpotifyError(401, 'could not obtain a valid access token')
+
+    async def track(self, track_id):
+        return await self.request(f'/tracks/{track_id}')
+
+    async def album(self, album_id):
+        return await self.request(f'/albums/{album_id}')
+
+    async def playlist(self, playlist_id, fields=None):
+        params = {'additional_types': 'track'}
+        if fields:
+            params['fields'] = fields
+        return await self.request(f'/playlists/{playlist_id}', params=params)
+
+    async def next(self, page):
+        """Fetch the page after a paginated result, or None on the last page"""
+        if page.get('next'):
+            return await self.request(page['next'])
+        return None
+
+    async def warm_up(self):
+        """Open the connection pool and fetch a token ahead of the first request"""
+        await self._get_token()
+
+    async def close(self):
+        if self.session and not self.session.closed:
+            await self.session.close()
@@ -1,25 +1,56 @@
-import spotipy
-from spotipy.oauth2 import SpotifyClientCredentials
 import re
-from config import SPOTIFY_CLIENT_ID, SPOTIFY_CLIENT_SECRET, ERROR_MESSAGES
+import time
+from collections import OrderedDict
+from config import (SPOTIFY_CLIENT_ID, SPOTIFY_CLIENT_SECRET, ERROR_MESSAGES, SPOTIFY_CACHE_TTL,
+                    SPOTIFY_CACHE_MAX_ENTRIES, SPOTIFY_PLAYLIST_RECHECK_INTERVAL)
+from spotify_client import AsyncSpotifyClient
+from single_flight import SingleFlight
+
+
+class MetadataCache:
+    """Small in-memory LRU cache whose entries expire after a TTL"""
+    
+    def __init__(self, ttl=SPOTIFY_CACHE_TTL, max_entries=SPOTIFY_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries = OrderedDict()  # Key -> (stored at, value)
+        self.hits = 0
+        self.misses = 0
+    
+    def get(self, key):
+        """Return (stored at, value) for a live entry, or None"""
+        entry = self.entries.get(key)
+        if entry is None or time.time() - entry[0] > self.ttl:
+            self.entries.pop(key, None)
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry
+    
+    def put(self, key, value):
+        self.entries[key] = (time.time(), value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+    
+    def touch(self, key):
+        """Mark an entry as freshly validated"""
+        if key in self.entries:
+            self.entries[key] = (time.time(), self.entries[key][1])
+
 
 class SpotifyHandler:
     def __init__(self):
         self.sp = None
+        self.cache = MetadataCache()  # ('track'|'album'|'playlist', ID) -> metadata
+        self.flights = SingleFlight('spotify')  # Identical concurrent lookups share one request
         self._initialize_client()
     
     def _initialize_client(self):
         """Initialize Spotify client with credentials"""
         if SPOTIFY_CLIENT_ID and SPOTIFY_CLIENT_SECRET:
-            try:
-                client_credentials_manager = SpotifyClientCredentials(
-                    client_id=SPOTIFY_CLIENT_ID,
-                    client_secret=SPOTIFY_CLIENT_SECRET
-                )
-                self.sp = spotipy.Spotify(client_credentials_manager=client_credentials_manager)
-            except Exception as e:
-                print(f"Error initializing Spotify client: {e}")
-                self.sp = None
+            self.sp = AsyncSpotifyClient(SPOTIFY_CLIENT_ID, SPOTIFY_CLIENT_SECRET)
         else:
             self.sp = None
     
@@ -54,33 +85,76 @@ class SpotifyHandler:
         
         return None, None
     
-    def get_track_info(self, track_id):
+    def _parse_track(self, track):
+        """Convert a full Spotify track object to the bot's track info"""
+        return {
+            'title': track['name'],
+            'artist': ', '.join([artist['name'] for artist in track['artists']]),
+            'album': track['album']['name'],
+            'duration_ms': track['duration_ms'],
+            'external_urls': track['external_urls'],
+            'album_art': track['album']['images'][0]['url'] if track['album']['images'] else None
+        }
+    
+    async def get_track_info(self, track_id):
         """Get track information from Spotify"""
         if not self.sp:
             return None
         
+        cached = self.cache.get(('track', track_id))
+        if cached:
+            return cached[1]
+        
+        return await self.flights.run(('track', track_id), lambda: self._fetch_track_info(track_id))
+    
+    async def _fetch_track_info(self, track_id):
         try:
-            track = self.sp.track(track_id)
-            return {
-                'title': track['name'],
-                'artist': ', '.join([artist['name'] for artist in track['artists']]),
-                'album': track['album']['name'],
-                'duration_ms': track['duration_ms'],
-                'external_urls': track['external_urls'],
-                'album_art': track['album']['images'][0]['url'] if track['album']['images'] else None
-            }
+            track_info = self._parse_track(await self.sp.track(track_id))
+            self.cache.put(('track', track_id), track_info)
+            return track_info
         except Exception as e:
             print(f"Error getting track info: {e}")
             return None
     
-    def get_album_tracks(self, album_id, limit=20):
-        """Get tracks from an album"""
+    async def iter_pages(self, page, max_items=None):
+        """Yield items from a paginated Spotify response, following 'next' links"""
+        count = 0
+        while page:
+            for item in page['items']:
+                if max_items is not None and count >= max_items:
+                    return
+                count += 1
+                yield item
+            if max_items is not None and count >= max_items:
+                return
+            page = await self.sp.next(page)
+    
+    def _from_cache(self, entry, max_tracks):
+        """Return cached album/playlist info if it holds enough tracks for the request"""
+        info, complete = entry
+        if max_tracks is None or len(info['tracks']) < max_tracks:
+            return info if complete else None
+        return dict(info, tracks=info['tracks'][:max_tracks])
+    
+    async def get_album_tracks(self, album_id, max_tracks=None):
+        """Get tracks from an album, following pagination up to max_tracks"""
         if not self.sp:
             return None
         
+        cached = self.cache.get(('album', album_id))
+        if cached:
+            album_info = self._from_cache(cached[1], max_tracks)
+            if album_info:
+                return album_info
+        
+        return await self.flights.run(('album', album_id, max_tracks), lambda: self._fetch_album_tracks(album_id, max_tracks))
+    
+    async def _fetch_album_tracks(self, album_id, max_tracks):
         try:
-            album = self.sp.album(album_id)
-            tracks = self.sp.album_tracks(album_id, limit=limit)
+            # The album object already embeds the first page of its tracks
+            album = await self.sp.album(album_id)
+            tracks = album['tracks']
+            album_art = album['images'][0]['url'] if album['images'] else None
             
             album_info = {
                 'name': album['name'],
@@ -89,28 +163,56 @@ class SpotifyHandler:
                 'tracks': []
             }
             
-            for track in tracks['items']:
+            async for track in self.iter_pages(tracks, max_tracks):
                 track_info = {
                     'title': track['name'],
                     'artist': ', '.join([artist['name'] for artist in track['artists']]),
                     'duration_ms': track['duration_ms'],
-                    'external_urls': track['external_urls']
+                    'external_urls': track['external_urls'],
+                    'album_art': album_art
                 }
                 album_info['tracks'].append(track_info)
             
+            complete = len(album_info['tracks']) >= album['total_tracks']
+            self.cache.put(('album', album_id), (album_info, complete))
             return album_info
         except Exception as e:
             print(f"Error getting album tracks: {e}")
             return None
     
-    def get_playlist_tracks(self, playlist_id, limit=20):
-        """Get tracks from a playlist"""
+    async def get_playlist_tracks(self, playlist_id, max_tracks=None):
+        """Get tracks from a playlist, following pagination up to max_tracks"""
         if not self.sp:
             return None
         
+        key = ('playlist', playlist_id)
+        cached = self.cache.get(key)
+        if cached:
+            stored_at, (snapshot_id, entry) = cached
+            playlist_info = self._from_cache(entry, max_tracks)
+            if playlist_info and time.time() - stored_at < SPOTIFY_PLAYLIST_RECHECK_INTERVAL:
+                return playlist_info
+        else:
+            snapshot_id = playlist_info = None
+        
+        return await self.flights.run(
+            ('playlist', playlist_id, max_tracks),
+            lambda: self._fetch_playlist_tracks(playlist_id, max_tracks, snapshot_id, playlist_info)
+        )
+    
+    async def _fetch_playlist_tracks(self, playlist_id, max_tracks, snapshot_id, playlist_info):
+        key = ('playlist', playlist_id)
         try:
-            playlist = self.sp.playlist(playlist_id)
-            tracks = self.sp.playlist_tracks(playlist_id, limit=limit)
+            if playlist_info:
+                # Only reuse the cached tracks while the playlist is unchanged
+                current = await self.sp.playlist(playlist_id, fields='snapshot_id')
+                if current['snapshot_id'] == snapshot_id:
+                    self.cache.touch(key)
+                    return playlist_info
+            
+            # The playlist object already embeds the first page of its tracks
+            playlist = await self.sp.playlist(playlist_id)
+            tracks = playlist['tracks']
             
             playlist_info = {
                 'name': playlist['name'],
@@ -119,17 +221,23 @@ class SpotifyHandler:
                 'tracks': []
             }
             
-            for item in tracks['items']:
+            complete = True
+            async for item in self.iter_pages(tracks):
+                if max_tracks is not None and len(playlist_info['tracks']) >= max_tracks:
+                    complete = False
+                    break
                 if item['track'] and item['track']['type'] == 'track':
                     track = item['track']
                     track_info = {
                         'title': track['name'],
                         'artist': ', '.join([artist['name'] for artist in track['artists']]),
                         'duration_ms': track['duration_ms'],
-                        'external_urls': track['external_urls']
+                        'external_urls': track['external_urls'],
+                        'album_art': track['album']['images'][0]['url'] if track['album']['images'] else None
                     }
                     playlist_info['tracks'].append(track_info)
             
+            self.cache.put(key, (playlist['snapshot_id'], (playlist_info, complete)))
             return playlist_info
         except Exception as e:
             print(f"Error getting playlist tracks: {e}")
@@ -157,3 +265,13 @@ class SpotifyHandler:
     def is_configured(self):
         """Check if Spotify API is configured"""
         return self.sp is not None
+    
+    async def warm_up(self):
+        """Get the Spotify client ready before the first link is played"""
+        if self.sp:
+            await self.sp.warm_up()
+    
+    async def close(self):
+        """Close the Spotify HTTP session"""
+        if self.sp:
+            await self.sp.close()
@@ -0,0 +1,75 @@
+import time
+from urllib.parse import urlparse, parse_qs
+from config import STREAM_CACHE_DEFAULT_TTL, STREAM_CACHE_SAFETY_MARGIN, STREAM_CACHE_MAX_ENTRIES
+
+
+def get_url_expiry(url, default_ttl=STREAM_CACHE_DEFAULT_TTL):
+    """Return the unix time at which a signed stream URL stops working.
+
+    YouTube stream URLs carry an ``expire`` parameter (in the query string or
+    as an ``/expire/<ts>/`` path segment); other hosts get a default TTL.
+    """
+    parsed = urlparse(url)
+    expire = parse_qs(parsed.query).get('expire')
+    if expire:
+        try:
+            return float(expire[0])
+        except ValueError:
+            pass
+
+    parts = parsed.path.split('/')
+    if 'expire' in parts:
+        index = parts.index('expire')
+        if index + 1 < len(parts):
+            try:
+                return float(parts[index + 1])
+            except ValueError:
+                pass
+
+    return time.time() + default_ttl
+
+
+class StreamCache:
+    """In-memory webpage URL -> direct stream cache honouring URL expiry"""
+
+    def __init__(self, safety_margin=STREAM_CACHE_SAFETY_MARGIN, max_entries=STREAM_CACHE_MAX_ENTRIES):
+        self.safety_margin = safety_margin
+        self.max_entries = max_entries
+        self.entries = {}  # Webpage URL -> (stream info, expires at)
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, webpage_url):
+        """Return cached stream info that is still valid for a while, or None"""
+        entry = self.entries.get(webpage_url)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        stream, expires_at = entry
+        if expires_at - self.safety_margin <= time.time():
+            del self.entries[webpage_url]
+            self.misses += 1
+            return None
+        self.hits += 1
+        return stream
+
+    def put(self, webpage_url, stream):
+        """Remember the stream resolved for a webpage URL (a dict with at least 'url')"""
+        if len(self.entries) >= self.max_entries:
+            self.purge()
+        if len(self.entries) >= self.max_entries:
+            # Still full: drop the entry that expires first
+            oldest = min(self.entries, key=lambda key: self.entries[key][1])
+            del self.entries[oldest]
+        self.entries[webpage_url] = (stream, get_url_expiry(stream['url']))
+
+    def discard(self, webpage_url):
+        """Forget a stream, e.g. after it failed to open"""
+        self.entries.pop(webpage_url, None)
+
+    def purge(self):
+        """Remove every expired entry"""
+        deadline = time.time() + self.safety_margin
+        for key in [key for key, (_, expires_at) in self.entries.items() if expires_at <= deadline]:
+            del self.entries[key]
@@ -0,0 +1,99 @@
+import sys
+
+
+def format_duration(seconds):
+    """Format a duration in seconds as M:SS"""
+    if not seconds:
+        return "Unknown"
+    minutes, seconds = divmod(int(seconds), 60)
+    return f"{minutes}:{seconds:02d}"
+
+
+class Track:
+    """A queued song.
+
+    Uses __slots__ and interned strings for the values shared between many
+    entries (requester, artist) so big queues stay small. A track whose
+    ``url`` is None is a Spotify placeholder that still has to be looked up
+    on YouTube using ``query``.
+    """
+
+    __slots__ = ('title', 'url', 'query', 'duration', 'thumbnail', 'requester',
+                 'spotify_title', 'spotify_artist')
+
+    def __init__(self, title, url, duration=0, thumbnail='', requester='', query=None,
+                 spotify_title=None, spotify_artist=None):
+        self.title = title
+        self.url = url
+        self.query = query
+        self.duration = duration  # Seconds, 0 when unknown
+        self.thumbnail = thumbnail or ''
+        self.requester = sys.intern(requester)
+        self.spotify_title = spotify_title
+        self.spotify_artist = sys.intern(spotify_artist) if spotify_artist else None
+
+    @classmethod
+    def from_info(cls, info, requester, fallback_url=None, spotify_info=None):
+        """Build a track from yt-dlp (or search cache) metadata"""
+        track = cls(
+            title=info.get('title') or 'Unknown Title',
+            url=info.get('webpage_url') or fallback_url,
+            duration=int(info.get('duration') or 0),
+            thumbnail=info.get('thumbnail') or '',
+            requester=requester
+        )
+        if spotify_info:
+            track.spotify_title = spotify_info['title']
+            track.spotify_artist = sys.intern(spotify_info['artist'])
+            track.thumbnail = spotify_info.get('album_art') or track.thumbnail
+        return track
+
+    @classmethod
+    def from_spotify(cls, spotify_info, requester):
+        """Build an unresolved placeholder for a Spotify track"""
+        return cls(
+            title=f"{spotify_info['title']} - {spotify_info['artist']}",
+            url=None,
+            query=f"{spotify_info['title']} {spotify_info['artist']}",
+            duration=spotify_info['duration_ms'] // 1000,
+            thumbnail=spotify_info.get('album_art') or '',
+            requester=requester,
+            spotify_title=spotify_info['title'],
+            spotify_artist=spotify_info['artist']
+        )
+
+    @classmethod
+    def from_state(cls, state):
+        """Rebuild a track saved with to_state"""
+        return cls(**dict(zip(cls.__slots__, state)))
+
+    def to_state(self):
+        """Compact list of the track's fields, in __slots__ order, for snapshots"""
+        return [getattr(self, name) for name in self.__slots__]
+
+    @property
+    def resolved(self):
+        return self.url is not None
+
+    @property
+    def duration_str(self):
+        return format_duration(self.duration)
+
+    def resolve(self, info):
+        """Fill in a placeholder from the YouTube search result"""
+        self.title = info.get('title') or self.title
+        self.url = info.get('webpage_url') or self.query
+        self.duration = int(info.get('duration') or 0) or self.duration
+        self.thumbnail = self.thumbnail or info.get('thumbnail') or ''
+        self.query = None
+
+    def memory_usage(self):
+        """Approximate bytes held by this track, not counting interned strings"""
+        size = sys.getsizeof(self)
+        for value in (self.title, self.url, self.query, self.thumbnail, self.spotify_title):
+            if value is not None:
+                size += sys.getsizeof(value)
+        return size
+
+    def __repr__(self):
+        return f"<Track title={self.title!r} url={self.url!r}>"
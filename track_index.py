@@ -0,0 +1,280 @@
+import asyncio
+import json
+import math
+import os
+import re
+import sqlite3
+import time
+import unicodedata
+from array import array
+from collections import Counter
+from config import TRACK_INDEX_MAX_ENTRIES, TRACK_INDEX_MIN_SCORE, TRACK_INDEX_PATH
+
+# Title decorations that say nothing about which song it is
+NOISE_PATTERN = re.compile(
+    r'[(\[][^)\]]*(?:official|video|audio|lyrics?|visuali[sz]er|hd|hq|4k|remaster(?:ed)?)[^)\]]*[)\]]'
+)
+MAX_QUERIES_PER_TRACK = 5  # Recent search texts kept as extra ways to find a track
+CANDIDATE_GRAMS = 8  # Rarest query trigrams used to find candidates
+MAX_CANDIDATES = 200  # Documents sharing the most of those trigrams that get scored
+COMMON_GRAM_SHARE = 0.05  # Trigrams in more documents than this share are too common to find candidates
+MIN_MARGIN = 0.1  # How far a confident match must be ahead of the next-best track
+MATCH_CANDIDATES = 5  # Best trigram matches compared word by word for a confident match
+LOAD_BATCH = 500  # Tracks indexed between yields to the event loop while loading
+
+
+def normalize(text):
+    """Lowercase ASCII words, without accents, punctuation or title noise"""
+    text = NOISE_PATTERN.sub(' ', text.lower())
+    text = unicodedata.normalize('NFKD', text).encode('ascii', 'ignore').decode()
+    return ' '.join(re.findall(r'[a-z0-9]+', text))
+
+
+def trigrams(text):
+    """Trigrams of each word, padded like pg_trgm so short words still match"""
+    grams = set()
+    for word in text.split():
+        padded = f'  {word} '
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def edit_distance(a, b):
+    """Insertions, deletions, substitutions and swaps of neighbouring letters turning a into b"""
+    previous, current = None, list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        before, previous, current = previous, current, [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (a[i - 1] != b[j - 1]))
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], before[j - 2] + 1)
+    return current[-1]
+
+
+def same_word(query_word, word):
+    """Whether two words are equal, allowing one typo from five letters and two from nine"""
+    if query_word == word:
+        return True
+    allowed = 0 if len(query_word) < 5 else 1 if len(query_word) < 9 else 2
+    return allowed > 0 and abs(len(query_word) - len(word)) <= allowed and edit_distance(query_word, word) <= allowed
+
+
+def word_score(words, text):
+    """Dice overlap of a query's words with a text's words; 0 unless every query word is in the text"""
+    remaining = text.split()
+    size = len(remaining)
+    missing = []
+    for word in words:
+        if word in remaining:
+            remaining.remove(word)
+        else:
+            missing.append(word)
+    for word in missing:
+        found = next((candidate for candidate in remaining if same_word(word, candidate)), None)
+        if found is None:
+            return 0.0
+        remaining.remove(found)
+    return 2 * len(words) / (len(words) + size)
+
+
+class IndexedTrack:
+    __slots__ = ('number', 'title', 'url', 'duration', 'thumbnail', 'artist', 'plays', 'texts')
+
+    def __init__(self, number, title, url, duration, thumbnail, artist, plays, texts):
+        self.number = number
+        self.title = title
+        self.url = url
+        self.duration = duration
+        self.thumbnail = thumbnail
+        self.artist = artist
+        self.plays = plays
+        self.texts = texts  # Normalized texts indexed for this track, oldest first
+
+    def info(self):
+        """Metadata in the shape returned by the resolver, marked as coming from the index"""
+        return {'title': self.title, 'webpage_url': self.url, 'duration': self.duration,
+                'thumbnail': self.thumbnail, 'indexed': True}
+
+    def word_score(self, words):
+        """Best word overlap of a normalized query with one of the track's texts"""
+        return max((word_score(words, text) for text in self.texts), default=0.0)
+
+
+class TrackIndex:
+    """Typo-tolerant search over every track the bot has been asked to play.
+
+    Each track is indexed under its title, its Spotify artist and title, and
+    the last few searches that found it, using word trigrams. Trigram IDs
+    are stored in compact arrays; a lookup only scores the few documents
+    sharing the most of the query's rarest trigrams, so it stays under a
+    millisecond with tens of thousands of tracks. Play counts are kept in
+    SQLite and break ties between similar matches. A confident match needs
+    the query and one of the track's texts to share most of their words,
+    so a title or artist alone is not enough to skip the YouTube search.
+
+    The index is empty until load() has run, which the bot does in the
+    background after connecting; requests recorded before then are applied
+    once it finishes.
+    """
+
+    def __init__(self, path=TRACK_INDEX_PATH, max_entries=TRACK_INDEX_MAX_ENTRIES, min_score=TRACK_INDEX_MIN_SCORE):
+        self.max_entries = max_entries
+        self.min_score = min_score
+        self.hits = 0
+        self.misses = 0
+        self.tracks = []  # Track number -> IndexedTrack
+        self.by_url = {}  # Webpage URL -> IndexedTrack
+        self.documents = []  # Document number -> (track number, tuple of trigram IDs)
+        self.gram_ids = {}  # Trigram -> ID
+        self.postings = []  # Trigram ID -> array of document numbers
+        self.loaded = False
+        self.backlog = []  # record() calls made while loading
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.db = sqlite3.connect(path)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS track_index (
+                webpage_url TEXT PRIMARY KEY,
+                title TEXT,
+                duration INTEGER,
+                thumbnail TEXT,
+                artist TEXT,
+                plays INTEGER NOT NULL,
+                texts TEXT NOT NULL,
+                last_played REAL NOT NULL
+            )
+        """)
+        self.db.commit()
+
+    async def load(self):
+        """Read the stored tracks into memory, dropping the least played beyond the size limit"""
+        if self.loaded:
+            return
+        rows = self.db.execute(
+            'SELECT webpage_url, title, duration, thumbnail, artist, plays, texts FROM track_index '
+            'ORDER BY plays DESC, last_played DESC'
+        ).fetchall()
+        for position, (url, title, duration, thumbnail, artist, plays, texts) in enumerate(rows[:self.max_entries]):
+            track = IndexedTrack(len(self.tracks), title, url, duration, thumbnail, artist, plays, [])
+            self.tracks.append(track)
+            self.by_url[url] = track
+            for text in json.loads(texts):
+                self._add_text(track, text)
+            if position % LOAD_BATCH == LOAD_BATCH - 1:
+                await asyncio.sleep(0)
+        if len(rows) > self.max_entries:
+            self.db.executemany('DELETE FROM track_index WHERE webpage_url = ?',
+                                [(row[0],) for row in rows[self.max_entries:]])
+            self.db.commit()
+
+        self.loaded = True
+        for args in self.backlog:
+            self.record(*args)
+        self.backlog.clear()
+
+    def _add_text(self, track, text):
+        if not text or text in track.texts:
+            return
+        track.texts.append(text)
+        ids = []
+        for gram in trigrams(text):
+            gram_id = self.gram_ids.get(gram)
+            if gram_id is None:
+                gram_id = self.gram_ids[gram] = len(self.postings)
+                self.postings.append(array('I'))
+            self.postings[gram_id].append(len(self.documents))
+            ids.append(gram_id)
+        self.documents.append((track.number, tuple(ids)))
+
+    def record(self, info, query=None, spotify_info=None):
+        """Count a request for a resolved track and index the ways it was asked for"""
+        if not self.loaded:
+            self.backlog.append((info, query, spotify_info))
+            return
+        url = info.get('webpage_url')
+        if not url:
+            return
+        track = self.by_url.get(url)
+        if track is None:
+            if len(self.tracks) >= self.max_entries:
+                return
+            track = IndexedTrack(len(self.tracks), info.get('title') or 'Unknown Title', url,
+                                 int(info.get('duration') or 0), info.get('thumbnail') or '', None, 0, [])
+            self.tracks.append(track)
+            self.by_url[url] = track
+            self._add_text(track, normalize(track.title))
+
+        track.plays += 1
+        if info.get('indexed'):
+            # Found by the index itself; adding the query would reinforce a wrong match
+            query = spotify_info = None
+        if spotify_info:
+            track.artist = spotify_info['artist']
+            self._add_text(track, normalize(f"{spotify_info['title']} {spotify_info['artist']}"))
+        if query and not query.startswith(('http://', 'https://')):
+            # Older searches stay indexed in memory; only the recent ones are saved
+            self._add_text(track, normalize(query))
+
+        saved = track.texts[:1] + track.texts[1:][-MAX_QUERIES_PER_TRACK:]
+        self.db.execute(
+            'INSERT OR REPLACE INTO track_index VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+            (url, track.title, track.duration, track.thumbnail, track.artist, track.plays,
+             json.dumps(saved), time.time())
+        )
+        self.db.commit()
+
+    def search(self, query, limit=5):
+        """Best matching tracks as (IndexedTrack, score) pairs, best first"""
+        query_grams = trigrams(normalize(query))
+        grams = {self.gram_ids[gram] for gram in query_grams if gram in self.gram_ids}
+        if not grams:
+            return []
+        query_size = len(query_grams)
+
+        # Candidates are the documents sharing the most of the query's rarest trigrams
+        rare = sorted(grams, key=lambda gram_id: len(self.postings[gram_id]))[:CANDIDATE_GRAMS]
+        common_size = max(COMMON_GRAM_SHARE * len(self.documents), MAX_CANDIDATES)
+        rare = [gram_id for gram_id in rare if len(self.postings[gram_id]) <= common_size] or rare[:1]
+        counts = Counter()
+        for gram_id in rare:
+            counts.update(self.postings[gram_id])
+
+        scores = {}  # Track number -> best score over its documents
+        for document, _ in counts.most_common(MAX_CANDIDATES):
+            number, ids = self.documents[document]
+            common = len(grams.intersection(ids))
+            # Average of how much of the query was found and how closely the text matches as a whole
+            score = (common / query_size + 2 * common / (query_size + len(ids))) / 2
+            if score > scores.get(number, 0):
+                scores[number] = score
+
+        ranked = sorted(scores.items(), key=lambda item: item[1] + 0.01 * math.log1p(self.tracks[item[0]].plays),
+                        reverse=True)
+        return [(self.tracks[number], score) for number, score in ranked[:limit]]
+
+    def match(self, query):
+        """Metadata of the track a query clearly refers to, or None when unsure"""
+        words = normalize(query).split()
+        # Trigrams find the candidates; whole words decide, since an extra word like "live" or
+        # "cover" may mean a different upload and a missing one may mean a different song
+        scored = sorted(((track.word_score(words), track) for track, _ in self.search(query, MATCH_CANDIDATES)),
+                        key=lambda item: item[0], reverse=True)
+        confident = (scored and scored[0][0] >= self.min_score
+                     and (len(scored) == 1 or scored[0][0] - scored[1][0] >= MIN_MARGIN))
+        if not confident:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return scored[0][1].info()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {'hits': self.hits, 'misses': self.misses, 'hit_ratio': self.hits / total if total else 0.0,
+                'entries': len(self.tracks)}
+
+    def close(self):
+        self.db.close()